@@ -1,9 +1,17 @@
 import django
 from django.contrib import admin
-from django.db import models
+from django.db import connections, models
+try:
+    from django.db.models import OuterRef, Subquery
+except ImportError:
+    OuterRef = Subquery = None
 from django import forms
 from django.utils.translation import ugettext_lazy as _
 from django.http import HttpResponseRedirect, Http404
+from django.core.paginator import Paginator
+from django.contrib.admin.views.main import ChangeList, PAGE_VAR
+from django.db.models.functions import Substr
+from django.utils.functional import cached_property
 if django.VERSION < (1, 9):
     from django.conf.urls import patterns, url
 else:
@@ -22,7 +30,7 @@ except ImportError:
     from django.contrib.admin.util import display_for_field
     
 
-from chronograph.models import Job, Log
+from chronograph.models import ConcurrencyGroup, Job, Log
 
 
 class JobForm(forms.ModelForm):
@@ -48,6 +56,10 @@ class JobForm(forms.ModelForm):
                 len(cleaned_data.get('shell_command', '').strip()):
             raise forms.ValidationError(_("Must specify either command or "
                                         "shell command"))
+        depends_on = cleaned_data.get('depends_on')
+        if depends_on and self.instance.creates_cycle(depends_on):
+            raise forms.ValidationError(_("A job can't depend on itself, "
+                                          "directly or through other jobs."))
         return cleaned_data
 
 
@@ -59,15 +71,20 @@ class JobAdmin(admin.ModelAdmin):
         'frequency', 'is_running', 'run_button', 'view_logs_button',
     )
     list_display_links = ('name', )
-    list_filter = ('last_run_successful', 'frequency', 'disabled')
+    list_filter = ('last_run_successful', 'frequency', 'disabled', 'concurrency_group')
     search_fields = ('name', )
     ordering = ('last_run', )
-    filter_horizontal = ('subscribers', 'info_subscribers')
+    filter_horizontal = ('subscribers', 'info_subscribers', 'depends_on')
+    readonly_fields = ('skipped_runs', 'total_runs', 'total_failures', 'last_duration', 'last_lag', )
 
     fieldsets = (
         (_('Job Details'), {
             'classes': ('wide',),
-            'fields': ('name', 'command', 'shell_command', 'run_in_shell', 'args', 'disabled',)
+            'fields': ('name', 'command', 'shell_command', 'run_in_shell', 'args', 'timeout', 'disabled', 'run_alone', 'priority', 'concurrency_group',)
+        }),
+        (_('Logging'), {
+            'classes': ('wide',),
+            'fields': ('log_policy', 'log_sample_rate', 'log_keep_runs', 'log_keep_failures_days',)
         }),
         (_('E-mail subscriptions'), {
             'classes': ('wide',),
@@ -75,21 +92,41 @@ class JobAdmin(admin.ModelAdmin):
         }),
         (_('Frequency options'), {
             'classes': ('wide',),
-            'fields': ('frequency', 'next_run', 'params',)
+            'fields': ('frequency', 'next_run', 'params', 'jitter', 'misfire_policy', 'misfire_limit', 'overlap_policy', 'skipped_runs', 'depends_on',)
+        }),
+        (_('Statistics'), {
+            'classes': ('wide', 'collapse'),
+            'fields': ('total_runs', 'total_failures', 'last_duration', 'last_lag',)
         }),
     )
 
+    def get_queryset(self, request):
+        queryset = super(JobAdmin, self).get_queryset(request)
+        if Subquery is not None:
+            # Fetch each job's latest log id along with the job itself rather
+            # than with one query per row in ``last_run_with_link``
+            latest_log = Log.objects.filter(job=OuterRef('pk')) \
+                .order_by('-run_date').values('pk')[:1]
+            queryset = queryset.annotate(latest_log_id=Subquery(latest_log))
+        return queryset
+
     def disable_jobs(self, request, queryset):
         return queryset.update(disabled=True)
 
     def reset_jobs(self, request, queryset):
-        return queryset.update(is_running=False)
+        return queryset.update(is_running=False, running_by='', heartbeat=None)
 
     def last_run_with_link(self, obj):
         value = display_for_field(obj.last_run,
                                   obj._meta.get_field('last_run'),
                                   '')
-        log_id = obj.log_set.latest('run_date').id
+        if hasattr(obj, 'latest_log_id'):
+            log_id = obj.latest_log_id
+        else:
+            log_id = obj.log_set.values_list('pk', flat=True) \
+                .order_by('-run_date').first()
+        if log_id is None:
+            return value
         try:
             # Old way
             reversed_url = reverse('chronograph_log_change', args=(log_id,))
@@ -127,8 +164,10 @@ class JobAdmin(admin.ModelAdmin):
             job = Job.objects.get(pk=pk)
         except Job.DoesNotExist:
             raise Http404
-        job.run()
-        message = _('The job "%(job)s" was run successfully.') % {'job': job}
+        if job.run():
+            message = _('The job "%(job)s" was run successfully.') % {'job': job}
+        else:
+            message = _('The job "%(job)s" is already running.') % {'job': job}
         if hasattr(self, 'message_user'):
             self.message_user(request, message)
         else:
@@ -149,10 +188,90 @@ class JobAdmin(admin.ModelAdmin):
         return my_urls + urls
 
 
+# Number of characters of output shown in the log changelist
+PREVIEW_LENGTH = 40
+
+# Tables estimated to hold more rows than this aren't counted exactly
+ESTIMATED_COUNT_THRESHOLD = 100000
+
+
+def _estimate_count(model, using):
+    """
+    Returns the database's own estimate of the number of rows in ``model``'s
+    table, or ``None`` if the backend doesn't keep one.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples FROM pg_class WHERE relname = %s", [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute("SELECT table_rows FROM information_schema.tables "
+                           "WHERE table_schema = DATABASE() AND table_name = %s", [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
+
+
+def _is_keyset_page(queryset):
+    """
+    Returns ``True`` if ``queryset`` is only filtered by the ``run_date__lt``
+    of the "Older logs" link.
+    """
+    children = queryset.query.where.children
+    if len(children) != 1:
+        return False
+    target = getattr(getattr(children[0], 'lhs', None), 'target', None)
+    return getattr(target, 'name', None) == 'run_date' and \
+        getattr(children[0], 'lookup_name', None) == 'lt'
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Uses the database's row estimate rather than ``COUNT(*)`` for unfiltered
+    lists of large tables, and for the pages of their "Older logs" link.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where or _is_keyset_page(queryset):
+            estimate = _estimate_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super(EstimatedCountPaginator, self).count
+
+
+class LogChangeList(ChangeList):
+
+    def __init__(self, request, *args, **kwargs):
+        super(LogChangeList, self).__init__(request, *args, **kwargs)
+        # Listing the dates means a DISTINCT over every log; only do it for
+        # the logs of one job
+        if 'job' not in request.GET:
+            self.date_hierarchy = None
+
+    def older_logs_url(self):
+        """
+        Returns the link to the logs before the last one shown, which seeks
+        on the ``run_date`` index instead of counting and skipping rows, or
+        ``None`` if this page isn't full.
+        """
+        results = list(self.result_list)
+        if len(results) < self.list_per_page:
+            return None
+        return self.get_query_string({'run_date__lt': results[-1].run_date.isoformat()},
+                                     [PAGE_VAR])
+
+
 class LogAdmin(admin.ModelAdmin):
     list_display = ('job_name', 'run_date', 'end_date', 'job_duration', 'job_success', 'output', 'errors', )
-    search_fields = ('stdout', 'stderr', 'job__name', 'job__command')
+    list_select_related = ('job', )
+    search_fields = ('job__name', 'job__command')
     date_hierarchy = 'run_date'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     fieldsets = (
         (None, {
             'fields': ('job_display', 'run_date', 'end_date', 'job_duration', 'job_success',)
@@ -163,6 +282,18 @@ class LogAdmin(admin.ModelAdmin):
     )
     readonly_fields = ('job_display', 'job_duration', 'job_success', 'run_date', 'end_date', 'stdout_display', 'stderr_display')
 
+    def get_changelist(self, request, **kwargs):
+        return LogChangeList
+
+    def get_queryset(self, request):
+        # Only fetch the start of the (possibly huge) output columns; they
+        # are loaded in full when a single log is viewed.  Compressed logs
+        # keep a plain text prefix, so nothing needs decompressing.
+        return super(LogAdmin, self).get_queryset(request) \
+            .defer('stdout', 'stderr', 'stdout_data', 'stderr_data') \
+            .annotate(stdout_preview=Substr('stdout', 1, PREVIEW_LENGTH + 1),
+                      stderr_preview=Substr('stderr', 1, PREVIEW_LENGTH + 1))
+
     def job_display(self, obj):
         related_url = reverse('admin:chronograph_job_change', args=(obj.pk,))
         return format_html('<a href="{0}">{1}</a>', related_url, obj)
@@ -182,32 +313,41 @@ class LogAdmin(admin.ModelAdmin):
     job_success.boolean = True
 
     def stdout_display(self, obj):
-        return mark_safe('<div>{}</div>'.format(linebreaks(obj.stdout, autoescape=True)))
+        return mark_safe('<div>{}</div>'.format(linebreaks(obj.get_stdout(), autoescape=True)))
     stdout_display.short_description = _('Stdout')
 
     def stderr_display(self, obj):
-        return mark_safe('<div>{}</div>'.format(linebreaks(obj.stderr, autoescape=True)))
+        return mark_safe('<div>{}</div>'.format(linebreaks(obj.get_stderr(), autoescape=True)))
     stderr_display.short_description = _('Stderr')
 
-    def output(self, obj):
-        result = obj.stdout or ''
-        if len(result) > 40:
-            result = result[:40] + '...'
-        result = escape(result)
+    def _preview(self, obj, name):
+        result = getattr(obj, '%s_preview' % name, None)
+        if result is None:
+            result = getattr(obj, name)
+        result = result or ''
+        if len(result) > PREVIEW_LENGTH:
+            result = result[:PREVIEW_LENGTH] + '...'
+        return escape(result)
 
-        return result or _('(No output)')
+    def output(self, obj):
+        return self._preview(obj, 'stdout') or _('(No output)')
 
     def errors(self, obj):
-        result = obj.stderr or ''
-        if len(result) > 40:
-            result = result[:40] + '...'
-        result = escape(result)
-
-        return result or _('(No errors)')
+        return self._preview(obj, 'stderr') or _('(No errors)')
 
     def has_add_permission(self, request):
         return False
 
 
+class ConcurrencyGroupAdmin(admin.ModelAdmin):
+    list_display = ('name', 'max_concurrency', 'running_jobs')
+    search_fields = ('name', )
+
+    def running_jobs(self, obj):
+        return obj.job_set.filter(is_running=True).count()
+    running_jobs.short_description = _('Running')
+
+
+admin.site.register(ConcurrencyGroup, ConcurrencyGroupAdmin)
 admin.site.register(Job, JobAdmin)
 admin.site.register(Log, LogAdmin)
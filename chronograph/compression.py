@@ -0,0 +1,47 @@
+import logging
+import zlib
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CODECS = {
+    'zlib': (zlib.compress, zlib.decompress),
+}
+if lzma is not None:
+    CODECS['lzma'] = (lzma.compress, lzma.decompress)
+
+# Unknown methods that have already been warned about
+_warned = set()
+
+
+def get_default_method():
+    """
+    Returns the compression method new logs are stored with, or ``''`` if
+    they are stored as plain text.
+
+    An unknown ``CHRONOGRAPH_LOG_COMPRESSION`` is logged and ignored rather
+    than losing the output of the run being logged.
+    """
+    method = getattr(settings, 'CHRONOGRAPH_LOG_COMPRESSION', None) or ''
+    if method and method not in CODECS:
+        if method not in _warned:
+            _warned.add(method)
+            logger.warning("Unknown CHRONOGRAPH_LOG_COMPRESSION %r (expected one of %s); "
+                           "storing logs uncompressed", method, ', '.join(sorted(CODECS)))
+        return ''
+    return method
+
+
+def compress(text, method):
+    return CODECS[method][0](text.encode('utf-8'))
+
+
+def decompress(data, method):
+    # Some database backends hand binary data back as a ``memoryview``
+    return CODECS[method][1](bytes(data)).decode('utf-8')
@@ -2,8 +2,46 @@ from django.core.management.base import BaseCommand
 
 class Command(BaseCommand):
     help = 'Runs all jobs that are due.'
-    
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--daemon',
+            action='store_true',
+            default=False,
+            help='Keep running and execute jobs as they become due.',
+        )
+        parser.add_argument(
+            '--max-sleep',
+            type=float,
+            default=None,
+            help='Maximum number of seconds the daemon sleeps between checks.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Number of jobs to run concurrently.',
+        )
+        parser.add_argument(
+            '--isolate',
+            action='store_true',
+            default=None,
+            help='Run management commands in pre-forked worker processes.',
+        )
+
     def handle(self, *args, **options):
-        from chronograph.models import Job
-        for job in Job.objects.due():
-            job.run()
\ No newline at end of file
+        from chronograph.notifications import notifier
+        from chronograph.scheduler import Scheduler
+        scheduler = Scheduler(max_sleep=options.get('max_sleep'),
+                              workers=options.get('workers'),
+                              isolate=options.get('isolate'))
+        # Send e-mails in the background and in batches
+        notifier.start()
+        try:
+            if options.get('daemon'):
+                scheduler.serve_forever()
+            else:
+                scheduler.run_due()
+        finally:
+            scheduler.close()
+            notifier.stop()
@@ -0,0 +1,113 @@
+# Python
+import time
+from datetime import timedelta
+
+# Django
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+# Chronograph
+from chronograph.models import Job, Log, now
+
+# The columns of the indexes added for the scheduler's queries
+INDEXES = (
+    (Job, ['disabled', 'is_running', 'next_run']),
+    (Log, ['job_id', 'run_date']),
+    (Log, ['run_date']),
+)
+
+
+class Command(BaseCommand):
+
+    help = ('Shows the query plans and timings of the scheduler\'s hot queries '
+            'on a seeded table of logs, with and without their indexes.  '
+            'Nothing is saved: all changes are rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--logs',
+            type=int,
+            default=1000000,
+            help='Number of logs to seed.',
+        )
+        parser.add_argument(
+            '--jobs',
+            type=int,
+            default=100,
+            help='Number of (disabled) jobs to spread the logs over.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of logs to insert per statement.',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            jobs = self.seed(options.get('jobs'), options.get('logs'), options.get('batch_size'))
+            self.analyze()
+
+            self.stdout.write('\n=== With indexes ===')
+            self.show_all(jobs[0])
+
+            if connection.features.can_rollback_ddl:
+                self.drop_indexes()
+                self.analyze()
+                self.stdout.write('\n=== Without indexes ===')
+                self.show_all(jobs[0])
+            else:
+                self.stdout.write('\nThe database can\'t roll back dropping an index, so '
+                                  'the plans without indexes are not shown.')
+
+            self.stdout.write('\nRolling back...')
+            transaction.set_rollback(True)
+
+    def seed(self, job_count, log_count, batch_size):
+        # Disabled, so that no scheduler picks them up
+        jobs = [Job.objects.create(name='cron_benchmark %d' % i, frequency='HOURLY',
+                                   shell_command='true', disabled=True)
+                for i in range(max(job_count, 1))]
+        start = now()
+        self.stdout.write('Seeding %d logs...' % log_count)
+        for offset in range(0, log_count, batch_size):
+            Log.objects.bulk_create(
+                Log(job=jobs[i % len(jobs)], run_date=start - timedelta(minutes=i))
+                for i in range(offset, min(offset + batch_size, log_count)))
+        return jobs
+
+    def analyze(self):
+        # Let the planner see the seeded rows
+        statement = {'postgresql': 'ANALYZE', 'sqlite': 'ANALYZE',
+                     'mysql': 'ANALYZE TABLE %s, %s'}.get(connection.vendor)
+        if statement:
+            qn = connection.ops.quote_name
+            if '%s' in statement:
+                statement %= (qn(Job._meta.db_table), qn(Log._meta.db_table))
+            with connection.cursor() as cursor:
+                cursor.execute(statement)
+
+    def drop_indexes(self):
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            for model, columns in INDEXES:
+                table = model._meta.db_table
+                constraints = connection.introspection.get_constraints(cursor, table)
+                for name, constraint in constraints.items():
+                    if constraint['index'] and not constraint['unique'] \
+                            and constraint['columns'] == columns:
+                        cursor.execute(connection.SchemaEditorClass.sql_delete_index
+                                       % {'table': qn(table), 'name': qn(name)})
+
+    def show_all(self, job):
+        self.show('Due jobs (cron)', Job.objects.due())
+        self.show("A job's latest log (admin)",
+                  Log.objects.filter(job=job).order_by('-run_date')[:1])
+        self.show('Old logs (cron_clean)',
+                  Log.objects.filter(run_date__lte=now() - timedelta(days=30)).values('pk')[:1000])
+
+    def show(self, title, queryset):
+        started = time.time()
+        list(queryset)
+        elapsed = time.time() - started
+        self.stdout.write('\n%s: %.1f ms\n%s' % (title, elapsed * 1000, queryset.explain()))
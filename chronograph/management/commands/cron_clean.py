@@ -1,12 +1,14 @@
 # Python
 import datetime
+import time
 
 # Django
 from django.core.management.base import BaseCommand
+from django.db.models import Q
 from django.utils import timezone
 
 # Chronograph
-from chronograph.models import Log
+from chronograph.models import Job, Log
 
 
 class Command( BaseCommand ):
@@ -24,9 +26,71 @@ class Command( BaseCommand ):
             type=int,
             help='Amount of the given unit.',
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of logs to delete per statement.',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0,
+            help='Seconds to pause between batches.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            default=False,
+            help='Only count the logs that would be deleted.',
+        )
     
     def handle(self, *args, **options):
         unit = options.get('unit')
         amount = options.get('amount')
+        self.batch_size = options.get('batch_size')
+        self.sleep = options.get('sleep')
+        self.dry_run = options.get('dry_run')
         time_ago = timezone.now() - datetime.timedelta(**{unit: amount})
-        Log.objects.filter(run_date__lte=time_ago).delete()
+
+        # Jobs with their own retention settings are cleaned one by one
+        retained = Job.objects.filter(
+            Q(log_keep_runs__isnull=False) | Q(log_keep_failures_days__isnull=False))
+        total = self.delete(Log.objects.filter(run_date__lte=time_ago)
+                            .exclude(job__in=retained))
+        for job in retained:
+            logs = job.log_set.filter(run_date__lte=time_ago)
+            if job.log_keep_runs:
+                oldest_kept = job.log_set.order_by('-run_date') \
+                    .values_list('run_date', flat=True)[job.log_keep_runs - 1:job.log_keep_runs]
+                if not oldest_kept:
+                    continue
+                logs = logs.filter(run_date__lt=oldest_kept[0])
+            if job.log_keep_failures_days:
+                failures_ago = timezone.now() - datetime.timedelta(days=job.log_keep_failures_days)
+                logs = logs.exclude(success=False, run_date__gt=failures_ago)
+            total += self.delete(logs)
+
+        if self.dry_run:
+            self.stdout.write('%d log(s) would be deleted.' % total)
+        else:
+            self.stdout.write('Deleted %d log(s).' % total)
+
+    def delete(self, logs):
+        """
+        Deletes ``logs`` in primary key ranges of at most ``batch_size`` rows
+        so that no single statement locks the table for long.
+        """
+        if self.dry_run:
+            return logs.count()
+
+        pks = logs.order_by('pk').values_list('pk', flat=True)
+        total = 0
+        while True:
+            batch = list(pks[:self.batch_size])
+            if not batch:
+                return total
+            logs.filter(pk__gte=batch[0], pk__lte=batch[-1]).delete()
+            total += len(batch)
+            if self.sleep:
+                time.sleep(self.sleep)
@@ -0,0 +1,50 @@
+# Django
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+# Chronograph
+from chronograph import compression
+from chronograph.models import Log
+
+
+class Command(BaseCommand):
+
+    help = 'Compresses the output of existing job logs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--method',
+            choices=sorted(compression.CODECS),
+            default=None,
+            help='Compression method (defaults to CHRONOGRAPH_LOG_COMPRESSION).',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of logs to compress at a time.',
+        )
+
+    def handle(self, *args, **options):
+        method = options.get('method') or compression.get_default_method()
+        if not method:
+            raise CommandError('No compression method given and '
+                               'CHRONOGRAPH_LOG_COMPRESSION is not set to a known one.')
+        batch_size = options.get('batch_size')
+
+        logs = Log.objects.filter(compression='') \
+            .exclude(Q(stdout='') & Q(stderr='')) \
+            .only('pk', 'stdout', 'stderr').order_by('pk')
+        last_pk, total = 0, 0
+        while True:
+            batch = list(logs.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            for log in batch:
+                log.set_output(log.stdout, log.stderr, method)
+                log.save(update_fields=('compression', 'stdout', 'stderr',
+                                        'stdout_data', 'stderr_data'))
+            last_pk = batch[-1].pk
+            total += len(batch)
+
+        self.stdout.write('Compressed %d log(s).' % total)
@@ -0,0 +1,50 @@
+# Python
+from datetime import timedelta
+
+# Django
+from django.core.management.base import BaseCommand
+
+# Chronograph
+from chronograph.models import Job, now
+
+
+class Command(BaseCommand):
+
+    help = 'Shows how many jobs are due to start in each of the coming minutes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--minutes',
+            type=int,
+            default=60,
+            help='Number of minutes to look ahead.',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            default=False,
+            help='Also list minutes in which no job starts.',
+        )
+
+    def handle(self, *args, **options):
+        start = now().replace(second=0, microsecond=0)
+        until = start + timedelta(minutes=options.get('minutes'))
+
+        counts = {}
+        for job in Job.objects.filter(disabled=False, next_run__isnull=False):
+            for when in job.get_upcoming_runs(until):
+                # Jobs that are already due start in the current minute
+                minute = max(when.replace(second=0, microsecond=0), start)
+                counts[minute] = counts.get(minute, 0) + 1
+
+        minute = start
+        while minute <= until:
+            count = counts.get(minute, 0)
+            if count or options.get('all'):
+                self.stdout.write('%s %5d %s' % (minute.strftime('%Y-%m-%d %H:%M'),
+                                                  count, '#' * min(count, 60)))
+            minute += timedelta(minutes=1)
+
+        if counts:
+            self.stdout.write('Busiest minute: %d job(s); total: %d.'
+                              % (max(counts.values()), sum(counts.values())))
@@ -0,0 +1,37 @@
+# Django
+from django.core.management.base import BaseCommand
+
+# Chronograph
+from chronograph.metrics import collect, render_prometheus
+
+
+def _seconds(value):
+    return '-' if value is None else '%.1f' % value
+
+
+class Command(BaseCommand):
+
+    help = 'Shows run counts, durations and lag of the jobs, and how many are waiting.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--prometheus',
+            action='store_true',
+            default=False,
+            help='Print the statistics in the Prometheus text format.',
+        )
+
+    def handle(self, *args, **options):
+        stats = collect()
+        if options.get('prometheus'):
+            self.stdout.write(render_prometheus(stats), ending='')
+            return
+
+        self.stdout.write('%-30s %8s %8s %8s %10s %10s' % (
+            'Job', 'Runs', 'Failed', 'Skipped', 'Duration', 'Lag'))
+        for job in stats['jobs']:
+            self.stdout.write('%-30s %8d %8d %8d %10s %10s' % (
+                job['name'][:30], job['total_runs'], job['total_failures'],
+                job['skipped_runs'], _seconds(job['last_duration']),
+                _seconds(job['last_lag'])))
+        self.stdout.write('Due: %d; running: %d.' % (stats['due'], stats['running']))
@@ -0,0 +1,58 @@
+from chronograph.models import Job
+
+# (metric name, type, help, job field) of the per-job metrics
+JOB_METRICS = (
+    ('chronograph_job_runs_total', 'counter', 'Number of times the job has run.', 'total_runs'),
+    ('chronograph_job_failures_total', 'counter', 'Number of failed runs.', 'total_failures'),
+    ('chronograph_job_skipped_runs_total', 'counter',
+     'Number of times the job came up while it was still running.', 'skipped_runs'),
+    ('chronograph_job_last_duration_seconds', 'gauge', 'Duration of the last run.', 'last_duration'),
+    ('chronograph_job_last_lag_seconds', 'gauge',
+     'How long after it was due the last scheduled run started.', 'last_lag'),
+    ('chronograph_job_last_success', 'gauge', 'Whether the last run succeeded.', 'last_run_successful'),
+    ('chronograph_job_running', 'gauge', 'Whether the job is running.', 'is_running'),
+)
+
+
+def collect():
+    """
+    Returns a dict with the number of jobs that are ``due`` and ``running``,
+    and a list of ``jobs`` with each job's counters.
+    """
+    fields = ['pk', 'name', 'disabled', 'next_run'] + [field for _, _, _, field in JOB_METRICS]
+    return {
+        'due': Job.objects.due().count(),
+        'running': Job.objects.filter(is_running=True).count(),
+        'jobs': list(Job.objects.order_by('name', 'pk').values(*fields)),
+    }
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(stats=None):
+    """
+    Returns ``stats`` (default: ``collect()``) in the Prometheus text
+    exposition format.
+    """
+    if stats is None:
+        stats = collect()
+    lines = [
+        '# HELP chronograph_jobs_due Number of jobs waiting to be run.',
+        '# TYPE chronograph_jobs_due gauge',
+        'chronograph_jobs_due %d' % stats['due'],
+        '# HELP chronograph_jobs_running Number of jobs running.',
+        '# TYPE chronograph_jobs_running gauge',
+        'chronograph_jobs_running %d' % stats['running'],
+    ]
+    for name, kind, help_text, field in JOB_METRICS:
+        lines.append('# HELP %s %s' % (name, help_text))
+        lines.append('# TYPE %s %s' % (name, kind))
+        for job in stats['jobs']:
+            value = job[field]
+            if value is None:
+                continue
+            lines.append('%s{job_id="%d",job="%s"} %s'
+                         % (name, job['pk'], _escape(job['name']), float(value)))
+    return '\n'.join(lines) + '\n'
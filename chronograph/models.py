@@ -1,16 +1,26 @@
+import os
 import sys
+import logging
+import random
+import hashlib
+import signal
+import zlib
 import traceback
 import subprocess
 import shlex
+import threading
+import multiprocessing.connection
 
-from datetime import datetime
+from datetime import datetime, timedelta
+from functools import lru_cache
 from dateutil import rrule
-from io import StringIO
 
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import connection, connections, models, transaction
+from django.db.models import Case, Value, When
 from django.contrib.auth.models import User
 from django.contrib.sites.models import Site
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage
 try:
     from django.core.urlresolvers import reverse
 except ImportError:
@@ -20,11 +30,34 @@ from django.utils.translation import ungettext, ugettext, ugettext_lazy as _
 from django.template import loader, Context
 from django.conf import settings
 from django.utils.encoding import smart_str
+
+from chronograph import compression
+from chronograph.notifications import notifier
+from chronograph.output import BoundedOutput, drain_in_thread, redirect_output
+from chronograph.signals import job_finished, job_started
 try:
     from django.utils.timezone import now
 except ImportError:
     now = datetime.now
 
+logger = logging.getLogger(__name__)
+
+# Seconds a timed out job is given to exit after ``SIGTERM`` before ``SIGKILL``.
+KILL_GRACE_PERIOD = 5
+
+# Characters of compressed output that are also kept in plain text
+OUTPUT_PREFIX_LENGTH = 100
+
+_TIMEOUT_MESSAGE = "\n\n*** Job timed out after %d seconds\n\n"
+
+# Run by ``python -c`` to call a management command in a new process; the
+# result is sent back over the pipe whose descriptor is the first argument.
+_CHILD_SCRIPT = (
+    "import sys, django; django.setup(); "
+    "from chronograph.models import _call_management_command_in_child; "
+    "_call_management_command_in_child(sys.argv[2], sys.argv[3], int(sys.argv[1]))"
+)
+
 class JobManager(models.Manager):
     def due(self):
         """
@@ -32,6 +65,103 @@ class JobManager(models.Manager):
         """
         return self.filter(next_run__lte=now(), disabled=False, is_running=False)
 
+    def claim_due(self, limit=None, worker_id='', exclude=None, not_before=None):
+        """
+        Marks up to ``limit`` due jobs as running by ``worker_id`` and returns
+        them as a list, highest ``priority`` first and, among jobs of the same
+        priority, the one that has waited longest first.  Jobs whose primary
+        key is in ``exclude``, or that were due before ``not_before``, are
+        left alone.
+
+        Every job is handed out exactly once, even when several schedulers on
+        different hosts claim at the same time: rows are locked with
+        ``SELECT ... FOR UPDATE SKIP LOCKED`` where the database supports it,
+        and claimed with ``UPDATE ... WHERE is_running``.  Jobs in a
+        ``ConcurrencyGroup`` are only claimed while the (locked) group has
+        fewer than ``max_concurrency`` jobs running.
+        """
+        candidates = self.due()
+        if exclude:
+            candidates = candidates.exclude(pk__in=exclude)
+        if not_before is not None:
+            candidates = candidates.filter(next_run__gte=not_before)
+        full = self.full_groups()
+        if full:
+            candidates = candidates.exclude(concurrency_group__in=full)
+        # The most important and then the most overdue jobs first
+        candidates = candidates.order_by('-priority', 'next_run') \
+            .values_list('pk', 'concurrency_group_id')
+        if limit is not None:
+            candidates = candidates[:limit]
+
+        features = connections[self.db].features
+        if getattr(features, 'has_select_for_update_skip_locked', False):
+            candidates = candidates.select_for_update(skip_locked=True)
+        if features.has_select_for_update:
+            with transaction.atomic(using=self.db):
+                pks = self._claim(candidates, worker_id)
+        else:
+            pks = self._claim(candidates, worker_id)
+
+        jobs = list(self.filter(pk__in=pks, running_by=worker_id).order_by('-priority', 'next_run'))
+        for job in jobs:
+            # Tells ``Job.run`` that this instance holds the claim
+            job._claimed = True
+        return jobs
+
+    def _claim(self, candidates, worker_id):
+        pks = []
+        room = {}
+        for pk, group_id in list(candidates):
+            if group_id is not None:
+                if group_id not in room:
+                    room[group_id] = self._group_room(group_id)
+                if room[group_id] <= 0:
+                    continue
+            if self.filter(pk=pk, is_running=False).update(
+                    is_running=True, running_by=worker_id, heartbeat=now()):
+                pks.append(pk)
+                if group_id is not None:
+                    room[group_id] -= 1
+        return pks
+
+    def full_groups(self):
+        """
+        Returns the ids of the concurrency groups that already have as many
+        running jobs as they allow.
+        """
+        running = self.filter(is_running=True, concurrency_group__isnull=False) \
+            .values_list('concurrency_group', 'concurrency_group__max_concurrency') \
+            .annotate(running=models.Count('pk')).order_by()
+        return [group for group, limit, count in running if count >= limit]
+
+    def _group_room(self, group_id):
+        # Lock the group so that schedulers on other hosts wait for this
+        # claim to commit before counting the group's running jobs
+        group = ConcurrencyGroup.objects.using(self.db).select_for_update().get(pk=group_id)
+        return group.max_concurrency - self.filter(concurrency_group=group, is_running=True).count()
+
+    def reclaim_stale(self, lease=None):
+        """
+        Releases running jobs whose worker hasn't sent a heartbeat for
+        ``lease`` seconds (``CHRONOGRAPH_LEASE_TIMEOUT``, default 300), and
+        returns how many there were.
+
+        Such a job's worker has most likely died, so the run is marked as
+        unsuccessful and the job becomes due again.
+        """
+        if lease is None:
+            lease = getattr(settings, 'CHRONOGRAPH_LEASE_TIMEOUT', 300)
+        return self.filter(
+            is_running=True,
+            heartbeat__lt=now() - timedelta(seconds=lease),
+        ).update(
+            is_running=False,
+            running_by='',
+            heartbeat=None,
+            last_run_successful=False,
+        )
+
 # A lot of rrule stuff is from django-schedule
 freqs = (   ("YEARLY", _("Yearly")),
             ("MONTHLY", _("Monthly")),
@@ -41,6 +171,55 @@ freqs = (   ("YEARLY", _("Yearly")),
             ("MINUTELY", _("Minutely")),
             ("SECONDLY", _("Secondly")))
 
+LOG_ALWAYS = 'always'
+LOG_OUTPUT = 'output'
+LOG_FAILURE = 'failure'
+LOG_SAMPLE = 'sample'
+log_policies = (
+    (LOG_ALWAYS, _("Every run")),
+    (LOG_OUTPUT, _("Failed runs and runs with output")),
+    (LOG_FAILURE, _("Failed runs only")),
+    (LOG_SAMPLE, _("Failed runs and a sample of successful runs")),
+)
+
+MISFIRE_RUN_ONCE = 'once'
+MISFIRE_RUN_ALL = 'all'
+MISFIRE_SKIP = 'skip'
+misfire_policies = (
+    (MISFIRE_RUN_ONCE, _("Run once")),
+    (MISFIRE_RUN_ALL, _("Run every missed time")),
+    (MISFIRE_SKIP, _("Skip")),
+)
+
+OVERLAP_COALESCE = 'coalesce'
+OVERLAP_SKIP = 'skip'
+overlap_policies = (
+    (OVERLAP_COALESCE, _("Run once more when it finishes")),
+    (OVERLAP_SKIP, _("Skip")),
+)
+
+ALERT_FAILURE = 'failure'
+ALERT_RECOVERED = 'recovered'
+
+class ConcurrencyGroup(models.Model):
+    """
+    A shared resource, such as an external database, that at most
+    ``max_concurrency`` of its jobs may use at the same time.
+    """
+    name = models.CharField(_("name"), max_length=200, unique=True)
+    max_concurrency = models.PositiveIntegerField(_("max concurrency"), default=1,
+        help_text=_("The most jobs in this group that may run at the same time."))
+
+    class Meta:
+        ordering = ('name',)
+
+    def __unicode__(self):
+        return u"%s" % self.name
+
+    def __str__(self):
+        return self.__unicode__()
+
+
 class Job(models.Model):
     """
     A recurring ``django-admin`` command to be run.
@@ -60,11 +239,54 @@ class Job(models.Model):
     run_in_shell = models.BooleanField(default=False, help_text=_('This command needs to run within a shell?'))
     args = models.CharField(_("args"), max_length=200, blank=True,
         help_text=_("Space separated list; e.g: arg1 option1=True"))
+    timeout = models.PositiveIntegerField(_("timeout"), blank=True, null=True,
+        help_text=_("Seconds after which the job is killed. Leave blank to use the default."))
     disabled = models.BooleanField(_("disabled"), default=False, help_text=_('If checked this job will never run.'))
+    run_alone = models.BooleanField(_("run alone"), default=False, help_text=_('If checked this job will not run in parallel with other jobs.'))
+    priority = models.IntegerField(_("priority"), default=0,
+        help_text=_("When more jobs are due than can be run at once, those with a higher priority go first."))
+    concurrency_group = models.ForeignKey(ConcurrencyGroup, on_delete=models.SET_NULL,
+        blank=True, null=True, verbose_name=_("concurrency group"),
+        help_text=_("Limits how many jobs using the same resource run at once."))
     next_run = models.DateTimeField(_("next run"), blank=True, null=True, help_text=_("If you don't set this it will be determined automatically"))
+    misfire_policy = models.CharField(_("misfire policy"), choices=misfire_policies,
+        max_length=10, default=MISFIRE_RUN_ONCE,
+        help_text=_("What to do when the job couldn't be run on time, e.g. after an outage."))
+    misfire_limit = models.PositiveIntegerField(_("misfire limit"), default=10,
+        help_text=_("When running every missed time, the most missed runs to catch up on."))
+    overlap_policy = models.CharField(_("overlap policy"), choices=overlap_policies,
+        max_length=10, default=OVERLAP_COALESCE,
+        help_text=_("What to do when the job comes up again while it is still running."))
+    skipped_runs = models.PositiveIntegerField(_("skipped runs"), default=0, editable=False,
+        help_text=_("How many times the job came up while it was still running and wasn't run for it."))
+    jitter = models.PositiveIntegerField(_("jitter"), blank=True, null=True,
+        help_text=_("Start the job up to this many seconds after its scheduled times, so jobs "
+                    "with the same schedule don't all start at once. Leave blank to use the default."))
     last_run = models.DateTimeField(_("last run"), editable=False, blank=True, null=True)
     is_running = models.BooleanField(_("Running?"), default=False, editable=False)
+    running_by = models.CharField(_("running by"), max_length=200, blank=True, editable=False)
+    heartbeat = models.DateTimeField(_("heartbeat"), blank=True, null=True, editable=False)
     last_run_successful = models.BooleanField(default=True, blank=False, null=False, editable=False)
+    log_policy = models.CharField(_("log policy"), choices=log_policies,
+        max_length=10, default=LOG_ALWAYS, help_text=_("Which runs are recorded in the log."))
+    log_sample_rate = models.PositiveIntegerField(_("log sample rate"), default=10,
+        help_text=_("With sampling, log one in this many successful runs."))
+    log_keep_runs = models.PositiveIntegerField(_("keep last runs"), blank=True, null=True,
+        help_text=_("cron_clean always keeps at least this many of the latest logs."))
+    log_keep_failures_days = models.PositiveIntegerField(_("keep failures for days"), blank=True, null=True,
+        help_text=_("cron_clean keeps logs of failed runs for at least this many days."))
+    total_runs = models.PositiveIntegerField(_("runs"), default=0, editable=False)
+    total_failures = models.PositiveIntegerField(_("failures"), default=0, editable=False)
+    last_duration = models.FloatField(_("last duration"), blank=True, null=True, editable=False,
+        help_text=_("How many seconds the last run took."))
+    last_lag = models.FloatField(_("last lag"), blank=True, null=True, editable=False,
+        help_text=_("How many seconds after it was due the last scheduled run started."))
+    alert_hash = models.CharField(max_length=40, blank=True, editable=False)
+    alert_sent = models.DateTimeField(blank=True, null=True, editable=False)
+    depends_on = models.ManyToManyField('self', symmetrical=False, related_name='dependents', blank=True,
+        verbose_name=_("depends on"),
+        help_text=_("Run this job as soon as all of these jobs have succeeded since it last ran."))
+    trigger_pending = models.BooleanField(default=False, editable=False)
     info_subscribers = models.ManyToManyField(User, related_name='info_subscribers_set', blank=True)
     subscribers = models.ManyToManyField(User, related_name='error_subscribers_set', blank=True, verbose_name=_("error subscribers"))
 
@@ -72,6 +294,8 @@ class Job(models.Model):
 
     class Meta:
         ordering = ('disabled', 'next_run',)
+        # Covers ``JobManager.due``
+        index_together = (('disabled', 'is_running', 'next_run'),)
 
     def __unicode__(self):
         if self.disabled:
@@ -82,16 +306,24 @@ class Job(models.Model):
         return self.__unicode__()
 
     def save(self, *args, **kwargs):
+        schedule = False
         if not self.disabled:
             if not self.last_run:
                 self.last_run = now()
             if not self.next_run:
-                self.next_run = self.rrule.after(self.last_run)
+                self.next_run = self.get_next_occurrence(self.last_run)
+                schedule = self.pk is None
         else:
             self.next_run = None
 
         super(Job, self).save(*args, **kwargs)
 
+        if schedule and self.get_jitter_offset():
+            # The jitter offset depends on the primary key, which a new job
+            # only has now
+            self.next_run = self.get_next_occurrence(self.last_run)
+            self.__class__.objects.filter(pk=self.pk).update(next_run=self.next_run)
+
     def get_timeuntil(self):
         """
         Returns a string representing the time until the next
@@ -116,14 +348,89 @@ class Job(models.Model):
     get_timeuntil.short_description = _('time until next run')
     timeuntil = property(get_timeuntil)
 
+    def clean(self):
+        try:
+            self.get_rrule()
+        except (ValueError, TypeError) as e:
+            raise ValidationError({'params': _("Invalid rrule parameters: %(error)s") % {'error': e}})
+
     def get_rrule(self):
         """
         Returns the rrule objects for this Job.
+
+        The rrule is cached on the instance until ``frequency``, ``params`` or
+        ``last_run`` change.
         """
-        frequency = getattr(rrule, self.frequency, rrule.DAILY)
-        return rrule.rrule(frequency, dtstart=self.last_run, **self.get_params())
+        key = (self.frequency, self.params, self.last_run)
+        cached = getattr(self, '_rrule_cache', None)
+        if cached is None or cached[0] != key:
+            cached = (key, self._make_rrule(self.last_run))
+            self._rrule_cache = cached
+        return cached[1]
     rrule = property(get_rrule)
 
+    def _make_rrule(self, dtstart):
+        frequency = getattr(rrule, self.frequency, rrule.DAILY)
+        return rrule.rrule(frequency, dtstart=dtstart, **self.get_params())
+
+    def get_jitter_offset(self):
+        """
+        Returns how many seconds after its scheduled times this job starts.
+
+        The offset is picked from ``jitter`` seconds (or
+        ``CHRONOGRAPH_JITTER``, default: 0) by hashing the job's id, so it
+        stays the same from one run to the next.
+        """
+        window = self.jitter
+        if window is None:
+            window = getattr(settings, 'CHRONOGRAPH_JITTER', 0)
+        if not window or self.pk is None:
+            return 0
+        return zlib.crc32(str(self.pk).encode('utf-8')) % (window + 1)
+
+    def _get_schedule(self, run_date):
+        # Work out the schedule from the unjittered time, so that the offset
+        # isn't added again on every run
+        offset = timedelta(seconds=self.get_jitter_offset())
+        base = run_date - offset
+        rule = self.rrule if base == self.last_run else self._make_rrule(base)
+        return rule, offset
+
+    def get_next_occurrence(self, after, run_date=None):
+        """
+        Returns the first (jittered) occurrence after ``after`` of the
+        schedule following a run at ``run_date`` (default: ``after``), or
+        ``None`` if there are no more.
+        """
+        rule, offset = self._get_schedule(run_date or after)
+        occurrence = rule.after(after - offset)
+        if occurrence is None:
+            return None
+        return occurrence + offset
+
+    def get_overlapping_runs(self, run_date, end_date):
+        """
+        Returns how many times the job came up while a run from ``run_date``
+        to ``end_date`` was still going.
+        """
+        rule, offset = self._get_schedule(run_date)
+        return len(rule.between(run_date - offset, end_date - offset))
+
+    def get_upcoming_runs(self, until):
+        """
+        Yields the times this job is expected to run from ``next_run`` up to
+        ``until``, assuming every run starts on time.  An overdue job runs
+        once, as soon as it can, and then carries on from the present.
+        """
+        when = self.next_run
+        current = now()
+        if when is not None and when < current <= until:
+            yield when
+            when = self.get_next_occurrence(current)
+        while when is not None and when <= until:
+            yield when
+            when = self.get_next_occurrence(when)
+
     def get_params(self):
         """
         >>> job = Job(params = "count:1;bysecond:1;byminute:1,2,4,5")
@@ -132,16 +439,8 @@ class Job(models.Model):
         """
         if self.params is None:
             return {}
-        params = self.params.split(';')
-        param_dict = []
-        for param in params:
-            param = param.split(':')
-            if len(param) == 2:
-                param = (str(param[0]), [int(p) for p in param[1].split(',')])
-                if len(param[1]) == 1:
-                    param = (param[0], param[1][0])
-                param_dict.append(param)
-        return dict(param_dict)
+        return dict((key, list(value) if isinstance(value, tuple) else value)
+                    for key, value in _parse_params(self.params))
 
     def get_args(self):
         """
@@ -157,111 +456,420 @@ class Job(models.Model):
                 args.append(arg)
         return (args, options)
 
-    def run(self, save=True):
+    def run(self, save=True, worker_pool=None):
         """
         Runs this ``Job``.  If ``save`` is ``True`` the dates (``last_run`` and ``next_run``)
         are updated.  If ``save`` is ``False`` the job simply gets run and nothing changes.
 
-        A ``Log`` will be created if there is any output from either stdout or stderr.
+        A job that wasn't handed out by ``JobManager.claim_due`` is claimed
+        first; if it is already running nothing is done and ``False`` is
+        returned.  Otherwise ``True`` is returned once the job has run.
+
+        Management commands are run on ``worker_pool`` (a
+        ``chronograph.workers.WorkerPool``) if one is given.
+
+        A ``Log`` is saved according to the job's ``log_policy``; see ``should_log``.
+
+        ``chronograph.signals.job_started`` and ``job_finished`` are sent
+        before and after the job is run.
         """
         run_date = now()
-        self.is_running = True
-        self.save()
+        scheduled = self.next_run
+        if scheduled is not None and scheduled <= run_date:
+            lag = (run_date - scheduled).total_seconds()
+        else:
+            lag = None
+        if not getattr(self, '_claimed', False):
+            # Jobs handed out by ``JobManager.claim_due`` are already claimed
+            if not self.__class__.objects.filter(pk=self.pk, is_running=False) \
+                    .update(is_running=True, running_by='', heartbeat=run_date):
+                return False
+            self.is_running = True
+            self.running_by = ''
+            self.heartbeat = run_date
+        self._claimed = False
+        _send(job_started, job=self, lag=lag)
 
         stdout_str, stderr_str = "", ""
+        successful = False
+        heartbeat = _Heartbeat(self)
+        heartbeat.start()
 
         try:
             if self.shell_command:
                 successful, stdout_str, stderr_str = self.run_shell_command()
             else:
-                successful, stdout_str, stderr_str = self.run_management_command()
+                successful, stdout_str, stderr_str = self.run_management_command(worker_pool)
         finally:
-            # since jobs can be long running, reload the object to pick up
-            # any updates to the object since the job started
-            self = self.__class__.objects.get(id=self.id)
+            heartbeat.stop()
+            end_date = now()
+            owner = self.running_by
             self.last_run_successful = successful
             self.is_running = False
-            self.save()
+            self.running_by = ''
+            self.heartbeat = None
+            duration = (end_date - run_date).total_seconds()
+            alert = self.update_alert_state(successful, stderr_str, run_date)
+            self.total_runs += 1
+            self.last_duration = duration
+            fields = {
+                'last_run_successful': successful,
+                'is_running': False,
+                'running_by': '',
+                'heartbeat': None,
+                'alert_hash': self.alert_hash,
+                'alert_sent': self.alert_sent,
+                'total_runs': models.F('total_runs') + 1,
+                'last_duration': duration,
+            }
+            if not successful:
+                self.total_failures += 1
+                fields['total_failures'] = models.F('total_failures') + 1
+            if lag is not None:
+                self.last_lag = lag
+                fields['last_lag'] = lag
+            if save:
+                self.last_run = run_date
+                self.next_run = self.get_next_run(scheduled, run_date, end_date)
+                fields['last_run'] = run_date
+                overlaps = self.get_overlapping_runs(run_date, end_date)
+                if self.overlap_policy != OVERLAP_SKIP:
+                    # All of them together make up the follow-up run
+                    overlaps = max(overlaps - 1, 0)
+                if overlaps:
+                    self.skipped_runs += overlaps
+                    fields['skipped_runs'] = models.F('skipped_runs') + overlaps
+                # The job may have been disabled, or a job it depends on
+                # may have succeeded, while it was running
+                date_field = models.DateTimeField()
+                fields['next_run'] = Case(When(disabled=True, then=Value(None, output_field=date_field)),
+                                          When(trigger_pending=True,
+                                               then=Value(end_date, output_field=date_field)),
+                                          default=Value(self.next_run, output_field=date_field),
+                                          output_field=date_field)
+                fields['trigger_pending'] = False
+            # Only touch the columns the run owns so that changes made in
+            # the admin while the job was running aren't overwritten.  If the
+            # lease ran out and the job was claimed again meanwhile, leave
+            # the new run alone.
+            lost_lease = not self.__class__.objects \
+                .filter(pk=self.pk, is_running=True, running_by=owner) \
+                .update(**fields)
+            if lost_lease:
+                logger.warning('Job %s lost its lease while running; '
+                               'its schedule was not updated', self.pk)
 
-        if save:
-            self.last_run = run_date
-            self.next_run = self.rrule.after(run_date)
-            self.save()
+        _send(job_finished, job=self, successful=successful, duration=duration, lag=lag)
 
-        end_date = now()
+        if save and successful and not lost_lease:
+            self.trigger_dependents()
 
-        # Create a log entry no matter what to see the last time the Job ran:
-        log = Log.objects.create(
+        log = Log(
             job = self,
             run_date = run_date,
             end_date = end_date,
-            stdout = stdout_str,
-            stderr = stderr_str,
             success = self.last_run_successful,
         )
+        log.set_output(stdout_str, stderr_str)
+        if alert or self.should_log(self.last_run_successful, stdout_str, stderr_str):
+            log.save()
 
         # If there was any output to stderr, e-mail it to any error (defualt) subscribers.
         # We'll assume that if there was any error output, even if there was also info ouput
         # That an error exists and needs to be dealt with
         if not self.last_run_successful:
-            log.email_subscribers()
+            if alert == ALERT_FAILURE:
+                log.email_subscribers()
+
+        else:
+            # Let the error subscribers know that the job works again
+            if alert == ALERT_RECOVERED:
+                log.email_subscribers(is_recovery=True)
+
+            # Otherwise - if there was only output to stdout, e-mail it to any info subscribers
+            if stdout_str or stderr_str:
+                log.email_subscribers(is_info=True)
 
-        # Otherwise - if there was only output to stdout, e-mail it to any info subscribers
-        elif stdout_str or stderr_str:
-            log.email_subscribers(is_info=True)
+        return True
 
-    def run_management_command(self):
+    def dependencies_met(self):
+        """
+        Returns ``True`` if every job this one depends on has succeeded since
+        this job last ran.
+        """
+        waiting = self.depends_on.exclude(last_run_successful=True, is_running=False)
+        if self.last_run is not None:
+            waiting = waiting | self.depends_on.filter(last_run__lt=self.last_run)
+        return not waiting.exists()
+
+    def trigger_dependents(self):
+        """
+        Makes the enabled jobs that depend on this one due straight away if
+        all of their dependencies are met, and returns how many there were.
+
+        A dependent that is running is marked with ``trigger_pending`` instead,
+        and runs again as soon as it has finished.
+        """
+        triggered = 0
+        for dependent in self.dependents.filter(disabled=False):
+            if dependent.dependencies_met():
+                jobs = self.__class__.objects.filter(pk=dependent.pk, disabled=False)
+                # Mark a running dependent first, so that one finishing in
+                # between is caught by the second update
+                pending = jobs.filter(is_running=True).update(trigger_pending=True)
+                due = jobs.filter(is_running=False) \
+                    .filter(models.Q(next_run__isnull=True) | models.Q(next_run__gt=now())) \
+                    .update(next_run=now())
+                triggered += pending or due
+        return triggered
+
+    def creates_cycle(self, depends_on):
+        """
+        Returns ``True`` if making this job depend on the jobs ``depends_on``
+        would make it (indirectly) depend on itself.
+        """
+        if self.pk is None:
+            return False
+        through = self.__class__.depends_on.through
+        upstream = {}
+        for from_id, to_id in through.objects.values_list('from_job_id', 'to_job_id'):
+            upstream.setdefault(from_id, []).append(to_id)
+
+        pending = [job.pk for job in depends_on]
+        seen = set()
+        while pending:
+            pk = pending.pop()
+            if pk == self.pk:
+                return True
+            if pk not in seen:
+                seen.add(pk)
+                pending.extend(upstream.get(pk, ()))
+        return False
+
+    def is_misfire(self, scheduled, when):
+        """
+        Returns ``True`` if running at ``when`` is more than
+        ``CHRONOGRAPH_MISFIRE_GRACE`` seconds (default: 60) later than
+        ``scheduled``.
+        """
+        grace = timedelta(seconds=getattr(settings, 'CHRONOGRAPH_MISFIRE_GRACE', 60))
+        return scheduled is not None and when - scheduled > grace
+
+    def get_next_run(self, scheduled, run_date, end_date=None):
+        """
+        Returns when to run next after a run from ``run_date`` to
+        ``end_date`` that was due at ``scheduled``.
+
+        Normally that is the first occurrence after ``run_date``.  With the
+        ``MISFIRE_RUN_ALL`` policy, a late run catches up on the latest
+        ``misfire_limit`` missed times: it stands in for the first of them
+        and is followed by the others.
+
+        If that occurrence came up before the run finished, the
+        ``overlap_policy`` decides: ``OVERLAP_COALESCE`` runs the job once
+        more straight away, ``OVERLAP_SKIP`` waits for the first occurrence
+        after ``end_date``.
+        """
+        if self.misfire_policy == MISFIRE_RUN_ALL and self.misfire_limit \
+                and self.is_misfire(scheduled, run_date):
+            # Count occurrences from the missed one rather than from the
+            # last run so that catching up keeps to the original times
+            missed = [scheduled] + self._make_rrule(scheduled).between(scheduled, run_date)
+            catch_up = missed[-self.misfire_limit:]
+            if len(catch_up) > 1:
+                return catch_up[1]
+        next_run = self.get_next_occurrence(run_date)
+        if end_date is not None and next_run is not None and next_run <= end_date:
+            if self.overlap_policy == OVERLAP_SKIP:
+                next_run = self.get_next_occurrence(end_date, run_date)
+            else:
+                # Run now rather than at the missed time, so that the
+                # follow-up run doesn't count as a misfire
+                next_run = end_date
+        return next_run
+
+    def release(self):
+        """
+        Gives up a claimed run without running the job, leaving it due.
+        """
+        self.__class__.objects \
+            .filter(pk=self.pk, is_running=True, running_by=self.running_by) \
+            .update(is_running=False, running_by='', heartbeat=None)
+        self.is_running = False
+        self.running_by = ''
+        self.heartbeat = None
+        self._claimed = False
+
+    def skip_run(self):
+        """
+        Gives up a claimed run without running the job and schedules it for
+        its next occurrence.
+        """
+        if self.last_run:
+            # Keep to the job's usual (jittered) times
+            self.next_run = self.get_next_occurrence(now(), self.last_run)
+        else:
+            self.next_run = self.get_next_occurrence(now())
+        self.__class__.objects \
+            .filter(pk=self.pk, is_running=True, running_by=self.running_by) \
+            .update(next_run=self.next_run, is_running=False, running_by='', heartbeat=None)
+        self.is_running = False
+        self.running_by = ''
+        self.heartbeat = None
+        self._claimed = False
+
+    def update_alert_state(self, successful, stderr, when):
+        """
+        Decides whether error subscribers should hear about a run and records
+        the decision in ``alert_hash`` and ``alert_sent``.
+
+        Returns ``ALERT_FAILURE`` for a failure unless the same error output
+        was already sent within ``CHRONOGRAPH_ALERT_WINDOW`` seconds (default:
+        3600), ``ALERT_RECOVERED`` for the first success after a failure was
+        sent, and ``None`` otherwise.
+        """
+        if successful:
+            if not self.alert_hash:
+                return None
+            self.alert_hash = ''
+            self.alert_sent = None
+            return ALERT_RECOVERED
+
+        digest = hashlib.sha1(stderr.encode('utf-8')).hexdigest()
+        window = timedelta(seconds=getattr(settings, 'CHRONOGRAPH_ALERT_WINDOW', 3600))
+        if digest == self.alert_hash and self.alert_sent and when - self.alert_sent < window:
+            return None
+        self.alert_hash = digest
+        self.alert_sent = when
+        return ALERT_FAILURE
+
+    def should_log(self, successful, stdout, stderr):
+        """
+        Returns ``True`` if a run with the given outcome should be saved as a
+        ``Log``.  Failed runs are always logged.
+        """
+        if not successful or self.log_policy == LOG_ALWAYS:
+            return True
+        if self.log_policy == LOG_OUTPUT:
+            return bool(stdout or stderr)
+        if self.log_policy == LOG_SAMPLE:
+            return random.randrange(max(self.log_sample_rate, 1)) == 0
+        return False
+
+    def get_timeout(self):
+        """
+        Returns the number of seconds this job may run for, or ``None``.
+        """
+        return self.timeout or getattr(settings, 'CHRONOGRAPH_DEFAULT_TIMEOUT', None)
+
+    def run_management_command(self, worker_pool=None):
         """
         Runs a management command job
+
+        If the job has a timeout the command is run in a child process so
+        that it can be killed when the timeout expires.
         """
+        timeout = self.get_timeout()
+        if worker_pool is not None:
+            return worker_pool.run(self, timeout)
+        if timeout and hasattr(os, 'setsid'):
+            return self._run_management_command_in_child(timeout)
+
+        return self._call_management_command()
+
+    def _call_management_command(self):
         from django.core.management import call_command
 
         args, options = self.get_args()
-        stdout = StringIO()
-        stderr = StringIO()
-
-        # Redirect output so that we can log it if there is any
-        ostdout = sys.stdout
-        ostderr = sys.stderr
-        sys.stdout = stdout
-        sys.stderr = stderr
-        stdout_str, stderr_str, exception_str = "", "", ""
+        stdout = BoundedOutput()
+        stderr = BoundedOutput()
 
-        try:
-            call_command(self.command, *args, **options)
-            successful = True
-        except Exception as e:
-            exception_str = self._get_exception_string(e, sys.exc_info())
-            successful = False
+        stdout_str, stderr_str, exception_str = "", "", ""
 
-        sys.stdout = ostdout
-        sys.stderr = ostderr
+        # Commands that use ``self.stdout`` get the streams directly; anything
+        # printed to ``sys.stdout`` in this thread is redirected as well.
+        with redirect_output(stdout, stderr):
+            try:
+                call_command(self.command, *args, stdout=stdout, stderr=stderr, **options)
+                successful = True
+            except Exception as e:
+                exception_str = self._get_exception_string(e, sys.exc_info())
+                successful = False
 
         stdout_str = stdout.getvalue()
         stderr_str = stderr.getvalue()
 
         return successful, stdout_str, stderr_str + exception_str
 
+    def _run_management_command_in_child(self, timeout):
+        # Start a new interpreter rather than forking: a fork copies the
+        # locks held by the scheduler's other threads and could deadlock
+        read_fd, write_fd = os.pipe()
+        try:
+            proc = _start_python(_CHILD_SCRIPT, [str(write_fd), self.command, self.args],
+                                 pass_fds=(write_fd,))
+        finally:
+            os.close(write_fd)
+        reader = multiprocessing.connection.Connection(read_fd, writable=False)
+
+        try:
+            if not reader.poll(timeout):
+                _kill_process_group(proc.pid, lambda grace: _wait(proc, grace))
+                proc.wait()
+                return False, "", _TIMEOUT_MESSAGE % timeout
+            try:
+                result = reader.recv()
+            except EOFError:
+                proc.wait()
+                result = (False, "", "\n\n*** Process ended with return code %d\n\n" % proc.returncode)
+            proc.wait()
+            return result
+        finally:
+            reader.close()
+
     def run_shell_command(self):
         """
         Returns the stdout and stderr of a command being run.
+
+        If the job has a timeout and the command runs for longer, its whole
+        process group is killed.
         """
         stdout_str, stderr_str = "", ""
         command = self.shell_command + ' ' + (self.args or '')
         if self.run_in_shell:
             command = _escape_shell_command(command)
         else:
-            command = shlex.split(command.encode('ascii'))
+            command = shlex.split(command)
+        timeout = self.get_timeout()
         try:
             proc = subprocess.Popen(command,
                                     shell = bool(self.run_in_shell),
                                     stdout = subprocess.PIPE,
-                                    stderr = subprocess.PIPE)
+                                    stderr = subprocess.PIPE,
+                                    start_new_session = True)
+
+            # Read the output as it is produced rather than all at once
+            stdout, stderr = BoundedOutput(), BoundedOutput()
+            readers = [drain_in_thread(proc.stdout, stdout),
+                       drain_in_thread(proc.stderr, stderr)]
 
-            stdout_str, stderr_str = proc.communicate()
-            if proc.returncode:
+            timed_out = False
+            try:
+                proc.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                _kill_process_group(proc.pid, lambda grace: _wait(proc, grace))
+                proc.wait()
+                timed_out = True
+            for reader in readers:
+                reader.join()
+
+            stdout_str = stdout.getvalue()
+            stderr_str = stderr.getvalue()
+            if timed_out:
+                stderr_str += _TIMEOUT_MESSAGE % timeout
+            elif proc.returncode:
                 stderr_str += "\n\n*** Process ended with return code %d\n\n" % proc.returncode
-            successful = not proc.returncode
+            successful = not timed_out and not proc.returncode
         except Exception as e:
             stderr_str += self._get_exception_string(e, sys.exc_info())
             successful = False
@@ -283,14 +891,19 @@ class Log(models.Model):
     """
 
     job = models.ForeignKey(Job, on_delete=models.CASCADE)
-    run_date = models.DateTimeField()
+    run_date = models.DateTimeField(db_index=True)
     end_date = models.DateTimeField(null=True)
     stdout = models.TextField(blank=True)
     stderr = models.TextField(blank=True)
     success = models.BooleanField(default=True, editable=False)
+    compression = models.CharField(max_length=10, blank=True, editable=False)
+    stdout_data = models.BinaryField(null=True, blank=True, editable=False)
+    stderr_data = models.BinaryField(null=True, blank=True, editable=False)
 
     class Meta:
         ordering = ('-run_date',)
+        # Covers a job's latest logs
+        index_together = (('job', 'run_date'),)
 
     def __unicode__(self):
         return u"%s" % self.job.name
@@ -304,12 +917,43 @@ class Log(models.Model):
         else:
             return None
 
-    def email_subscribers(self, is_info=False):
+    def set_output(self, stdout, stderr, method=None):
+        """
+        Stores ``stdout`` and ``stderr``, compressed with ``method`` (by default
+        ``CHRONOGRAPH_LOG_COMPRESSION``) if one is given.
+
+        Compressed output keeps its first ``OUTPUT_PREFIX_LENGTH`` characters
+        in plain text as well, for previews.
+        """
+        if method is None:
+            method = compression.get_default_method()
+        if method and (stdout or stderr):
+            self.compression = method
+            self.stdout = stdout[:OUTPUT_PREFIX_LENGTH]
+            self.stderr = stderr[:OUTPUT_PREFIX_LENGTH]
+            self.stdout_data = compression.compress(stdout, method)
+            self.stderr_data = compression.compress(stderr, method)
+        else:
+            self.compression = ''
+            self.stdout, self.stderr = stdout, stderr
+            self.stdout_data = self.stderr_data = None
+
+    def get_stdout(self):
+        if self.compression:
+            return compression.decompress(self.stdout_data, self.compression)
+        return self.stdout
+
+    def get_stderr(self):
+        if self.compression:
+            return compression.decompress(self.stderr_data, self.compression)
+        return self.stderr
+
+    def email_subscribers(self, is_info=False, is_recovery=False):
         subscribers = []
 
         if is_info:
             subscriber_set = self.job.info_subscribers.all()
-            info_output = self.stdout
+            info_output = self.get_stdout()
         else:
             subscriber_set = self.job.subscribers.all()
             info_output = "http://%(site)s%(path)s" % {
@@ -322,24 +966,117 @@ class Log(models.Model):
                 subscribers.append('"%s" <%s>' % (user.get_full_name(), user.email))
             else:
                 subscribers.append('"%s" <%s>' % (user.username, user.email))
+        if not subscribers:
+            return
 
-        ts = loader.get_template('chronograph/message_subject.txt')
+        if is_recovery:
+            ts = loader.get_template('chronograph/recovered_subject.txt')
+        else:
+            ts = loader.get_template('chronograph/message_subject.txt')
         tb = loader.get_template('chronograph/message_body.txt')
         c = {
             'log': self,
             'info_output': info_output,
-            'error_output': self.stderr,
+            'error_output': self.get_stderr(),
             'EMAIL_SUBJECT_PREFIX': settings.EMAIL_SUBJECT_PREFIX,
         }
         message_subject = ts.render(c)
         message_body = tb.render(c)
 
-        send_mail(
+        message = EmailMessage(
             from_email = settings.DEFAULT_FROM_EMAIL,
-            recipient_list = subscribers,
+            to = subscribers,
             subject = message_subject,
-            message = message_body
+            body = message_body
         )
+        notifier.send(message, job=self.job, failure=not (is_info or is_recovery))
+
+def _send(signal, **kwargs):
+    # A broken receiver mustn't stop the job from being run or recorded
+    for receiver, response in signal.send_robust(sender=Job, **kwargs):
+        if isinstance(response, Exception):
+            logger.error('Error in signal receiver %r', receiver, exc_info=response)
+
+
+@lru_cache(maxsize=1024)
+def _parse_params(params):
+    """
+    Parses a ``Job.params`` string into a tuple of ``(name, value)`` pairs.
+    Jobs usually share a handful of distinct strings, so the result is cached.
+    """
+    param_list = []
+    for param in params.split(';'):
+        param = param.split(':')
+        if len(param) == 2:
+            param = (str(param[0]), tuple(int(p) for p in param[1].split(',')))
+            if len(param[1]) == 1:
+                param = (param[0], param[1][0])
+            param_list.append(param)
+    return tuple(param_list)
+
+class _Heartbeat(threading.Thread):
+    """
+    Periodically refreshes ``Job.heartbeat`` while the job is running so that
+    ``JobManager.reclaim_stale`` can tell a live job from an abandoned one.
+    """
+
+    def __init__(self, job):
+        super(_Heartbeat, self).__init__()
+        self.daemon = True
+        self.job_id = job.pk
+        self.running_by = job.running_by
+        self.interval = getattr(settings, 'CHRONOGRAPH_HEARTBEAT_INTERVAL', 30)
+        self._stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self._stopped.wait(self.interval):
+                Job.objects.filter(pk=self.job_id, is_running=True,
+                                   running_by=self.running_by) \
+                    .update(heartbeat=now())
+        finally:
+            connection.close()
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+def _call_management_command_in_child(command, args, write_fd):
+    writer = multiprocessing.connection.Connection(write_fd, readable=False)
+    writer.send(Job(command=command, args=args)._call_management_command())
+    writer.close()
+
+def _start_python(script, args, pass_fds=()):
+    """
+    Runs ``script`` with ``args`` in a new Python interpreter, in its own
+    session, that can import and set up Django the same way as this process.
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, sys.path)))
+    if settings.SETTINGS_MODULE:
+        env['DJANGO_SETTINGS_MODULE'] = settings.SETTINGS_MODULE
+    return subprocess.Popen([sys.executable, '-c', script] + list(args), env=env,
+                            pass_fds=pass_fds, start_new_session=True)
+
+def _wait(proc, timeout):
+    try:
+        proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        pass
+
+def _kill_process_group(pgid, wait):
+    """
+    Sends ``SIGTERM`` to the process group ``pgid``, calls ``wait`` with the
+    grace period and then kills whatever is left of the group.
+    """
+    try:
+        os.killpg(pgid, signal.SIGTERM)
+    except OSError:
+        return
+    wait(KILL_GRACE_PERIOD)
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except OSError:
+        pass
 
 def _escape_shell_command(command):
     for n in ('`', '$', '"'):
@@ -0,0 +1,119 @@
+import logging
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+logger = logging.getLogger(__name__)
+
+
+class Notifier(object):
+    """
+    Sends subscriber e-mails.
+
+    Until ``start`` is called messages are sent straight away.  Once started,
+    messages are queued and sent every ``CHRONOGRAPH_EMAIL_INTERVAL`` seconds
+    (default: 10) from a background thread, over a single connection, so a
+    slow mail server doesn't hold up running jobs.  With
+    ``CHRONOGRAPH_EMAIL_DIGEST`` set, several failures of the same job that
+    are queued at the same time are combined into one message.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        if self.running:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the background thread after sending everything still queued.
+        """
+        if not self.running:
+            return
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+
+    def send(self, message, job=None, failure=False):
+        """
+        Sends or queues the ``EmailMessage`` ``message`` about ``job``.
+        """
+        if not self.running:
+            message.send()
+        else:
+            self._queue.put((job.pk if job else None, failure, message))
+
+    def flush(self):
+        """
+        Sends every queued message and returns how many were sent.
+        """
+        items = []
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if not items:
+            return 0
+
+        if getattr(settings, 'CHRONOGRAPH_EMAIL_DIGEST', False):
+            messages = self._digest(items)
+        else:
+            messages = [message for job_id, failure, message in items]
+
+        try:
+            return get_connection().send_messages(messages) or 0
+        except Exception:
+            logger.exception('Error sending %d job notification(s)', len(messages))
+            return 0
+
+    def _digest(self, items):
+        messages = []
+        failures = {}
+        for job_id, failure, message in items:
+            if failure and job_id is not None:
+                failures.setdefault(job_id, []).append(message)
+            else:
+                messages.append(message)
+
+        for job_messages in failures.values():
+            if len(job_messages) == 1:
+                messages.append(job_messages[0])
+                continue
+            first = job_messages[0]
+            recipients = []
+            for message in job_messages:
+                recipients.extend(r for r in message.to if r not in recipients)
+            messages.append(EmailMessage(
+                subject='%s (%d failures)' % (first.subject, len(job_messages)),
+                body=('\n\n' + '=' * 75 + '\n\n').join(m.body for m in job_messages),
+                from_email=first.from_email,
+                to=recipients,
+            ))
+        return messages
+
+    def _run(self):
+        interval = getattr(settings, 'CHRONOGRAPH_EMAIL_INTERVAL', 10)
+        while not self._stopped.wait(interval):
+            self.flush()
+        self.flush()
+
+
+notifier = Notifier()
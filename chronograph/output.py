@@ -0,0 +1,149 @@
+import codecs
+import io
+import sys
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Number of bytes read from a pipe at a time
+CHUNK_SIZE = 8192
+
+
+class BoundedOutput(io.TextIOBase):
+    """
+    A write-only text stream that keeps the first ``head`` and the last
+    ``tail`` characters written to it and drops everything in between, so
+    capturing a job's output takes a fixed amount of memory.
+    """
+
+    def __init__(self, head=None, tail=None):
+        if head is None:
+            head = getattr(settings, 'CHRONOGRAPH_OUTPUT_HEAD_SIZE', 65536)
+        if tail is None:
+            tail = getattr(settings, 'CHRONOGRAPH_OUTPUT_TAIL_SIZE', 65536)
+        self.head = head
+        self.tail = tail
+        self.dropped = 0
+        self._head = []
+        self._head_len = 0
+        self._tail = deque()
+        self._tail_len = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        length = len(data)
+
+        if self._head_len < self.head:
+            chunk = data[:self.head - self._head_len]
+            self._head.append(chunk)
+            self._head_len += len(chunk)
+            data = data[len(chunk):]
+
+        if data:
+            self._tail.append(data)
+            self._tail_len += len(data)
+            while self._tail_len > self.tail:
+                excess = self._tail_len - self.tail
+                first = self._tail[0]
+                if len(first) <= excess:
+                    self._tail.popleft()
+                    self._tail_len -= len(first)
+                    self.dropped += len(first)
+                else:
+                    self._tail[0] = first[excess:]
+                    self._tail_len -= excess
+                    self.dropped += excess
+
+        return length
+
+    def getvalue(self):
+        value = ''.join(self._head)
+        if self.dropped:
+            value += '\n\n*** %d characters of output omitted\n\n' % self.dropped
+        return value + ''.join(self._tail)
+
+
+def drain(pipe, output, encoding='utf-8'):
+    """
+    Reads the binary ``pipe`` until EOF, decoding it into ``output`` as the
+    data arrives.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    read = getattr(pipe, 'read1', pipe.read)
+    while True:
+        data = read(CHUNK_SIZE)
+        if not data:
+            break
+        output.write(decoder.decode(data))
+    output.write(decoder.decode(b'', final=True))
+    pipe.close()
+
+
+def drain_in_thread(pipe, output):
+    """
+    Starts a daemon thread running ``drain`` and returns it.
+    """
+    thread = threading.Thread(target=drain, args=(pipe, output))
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+class ThreadLocalStream(object):
+    """
+    Stands in for ``sys.stdout`` or ``sys.stderr`` and sends what is written
+    to the stream set for the current thread, or to ``default``.
+    """
+
+    def __init__(self, default):
+        self.default = default
+        self._local = threading.local()
+
+    def get_stream(self):
+        return getattr(self._local, 'stream', None) or self.default
+
+    def set_stream(self, stream):
+        self._local.stream = stream
+
+    def write(self, data):
+        return self.get_stream().write(data)
+
+    def flush(self):
+        return self.get_stream().flush()
+
+    def __getattr__(self, name):
+        return getattr(self.get_stream(), name)
+
+
+_install_lock = threading.Lock()
+
+
+def _install(name):
+    with _install_lock:
+        current = getattr(sys, name)
+        if not isinstance(current, ThreadLocalStream):
+            current = ThreadLocalStream(current)
+            setattr(sys, name, current)
+        return current
+
+
+@contextmanager
+def redirect_output(stdout, stderr):
+    """
+    Sends whatever the current thread prints to ``sys.stdout`` and
+    ``sys.stderr`` to ``stdout`` and ``stderr`` instead, leaving other threads
+    alone.
+    """
+    proxies = (_install('stdout'), _install('stderr'))
+    previous = [proxy._local.__dict__.get('stream') for proxy in proxies]
+    proxies[0].set_stream(stdout)
+    proxies[1].set_stream(stderr)
+    try:
+        yield
+    finally:
+        for proxy, stream in zip(proxies, previous):
+            proxy.set_stream(stream)
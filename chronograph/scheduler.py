@@ -0,0 +1,254 @@
+import logging
+import os
+import signal
+import socket
+import threading
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import close_old_connections, connection, connections
+from django.db.models import Min
+
+from chronograph.models import MISFIRE_SKIP, Job, _Heartbeat, now
+
+logger = logging.getLogger(__name__)
+
+# Never spin faster than this when something is still due after a pass
+# (e.g. a job whose ``next_run`` could not be advanced).
+MIN_SLEEP = 1
+
+
+class Scheduler(object):
+    """
+    Runs due jobs from a single long-lived process.
+
+    Rather than polling at a fixed interval the scheduler sleeps until the
+    earliest ``Job.next_run``, capped at ``max_sleep`` seconds so that jobs
+    added or edited in the admin are picked up in reasonable time.
+
+    ``SIGTERM`` lets the running job finish and then exits; ``SIGHUP`` drops
+    database connections and re-reads the schedule immediately.
+
+    Up to ``workers`` due jobs are run concurrently in threads.  Jobs marked
+    ``run_alone`` are run one at a time once the others have finished.
+
+    Jobs are claimed through ``Job.objects.claim_due`` only when a worker is
+    free, so any number of schedulers may share the same database.  The
+    scheduler wakes up whenever a job finishes or the next job is due, so a
+    long running job doesn't hold up the others.
+
+    With ``isolate`` management commands are run in a pool of ready
+    worker processes instead of in the scheduler itself.
+
+    At most ``CHRONOGRAPH_MAX_CATCH_UP`` late jobs (default: no limit) are
+    started per pass, so that coming back from an outage doesn't start every
+    job at once.
+
+    Jobs that depend on a job which has just succeeded are dispatched as soon
+    as it has finished.
+    """
+
+    def __init__(self, max_sleep=None, workers=None, worker_id=None, isolate=None):
+        if max_sleep is None:
+            max_sleep = getattr(settings, 'CHRONOGRAPH_DAEMON_MAX_SLEEP', 60)
+        if workers is None:
+            workers = getattr(settings, 'CHRONOGRAPH_MAX_WORKERS', 1)
+        self.max_sleep = max_sleep
+        self.workers = max(1, workers)
+        if worker_id is None:
+            worker_id = '%s:%d' % (socket.gethostname(), os.getpid())
+        self.worker_id = worker_id
+        if isolate is None:
+            isolate = getattr(settings, 'CHRONOGRAPH_ISOLATE_COMMANDS', False)
+        self.isolate = isolate
+        self.worker_pool = None
+        self.max_catch_up = getattr(settings, 'CHRONOGRAPH_MAX_CATCH_UP', None)
+        self.misfire_grace = getattr(settings, 'CHRONOGRAPH_MISFIRE_GRACE', 60)
+        self.stopping = False
+        self._reload = False
+        self._wakeup = threading.Event()
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(self.workers)
+        self._running = set()
+        # The ``next_run`` each job was last dispatched for
+        self._dispatched = {}
+
+    def run_job(self, job):
+        try:
+            job.run(worker_pool=self.worker_pool)
+        except Exception:
+            logger.exception('Error running job %s', job.pk)
+
+    def _run_job_in_thread(self, job):
+        try:
+            self.run_job(job)
+        finally:
+            connection.close()
+
+    def _job_done(self, future):
+        self._slots.release()
+        # Look for due jobs again, e.g. the dependents of the job
+        self._wakeup.set()
+
+    def _prune(self):
+        # Forget the jobs that have finished; returns the running ones
+        self._running = set(f for f in self._running if not f.done())
+        return self._running
+
+    def dispatch(self):
+        """
+        Claims due jobs and starts them while there are free workers, without
+        waiting for them to finish.  Returns ``True`` if it stopped because
+        every worker was busy.
+        """
+        if self.isolate and self.worker_pool is None:
+            from chronograph.workers import WorkerPool
+            self.worker_pool = WorkerPool(self.workers)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers)
+
+        stale = Job.objects.reclaim_stale()
+        if stale:
+            logger.warning('Reclaimed %d job(s) with an expired lease', stale)
+
+        # Jobs whose current occurrence has already been run
+        exclude = set()
+        catch_ups = 0
+
+        while not self.stopping:
+            if not self._slots.acquire(False):
+                return True
+            if self.stopping:
+                # Stopped while waiting for a worker; start nothing new
+                self._slots.release()
+                break
+            not_before = None
+            if self.max_catch_up is not None and catch_ups >= self.max_catch_up:
+                # Leave the remaining late jobs for the next pass
+                not_before = now() - timedelta(seconds=self.misfire_grace)
+            jobs = Job.objects.claim_due(limit=1, worker_id=self.worker_id,
+                                         exclude=exclude, not_before=not_before)
+            if not jobs:
+                self._slots.release()
+                break
+            job = jobs[0]
+
+            if self._dispatched.get(job.pk) == job.next_run:
+                # The run couldn't move ``next_run`` on; don't run the same
+                # occurrence again straight away
+                exclude.add(job.pk)
+                job.release()
+                self._slots.release()
+                continue
+            self._dispatched[job.pk] = job.next_run
+
+            if job.is_misfire(job.next_run, now()):
+                if job.misfire_policy == MISFIRE_SKIP:
+                    job.skip_run()
+                    self._slots.release()
+                    continue
+                catch_ups += 1
+
+            if job.run_alone or self.workers == 1:
+                if self._prune():
+                    # Keep the claim from expiring while the others finish
+                    heartbeat = _Heartbeat(job)
+                    heartbeat.start()
+                    try:
+                        wait(self._running)
+                    finally:
+                        heartbeat.stop()
+                if self.stopping:
+                    job.release()
+                    self._slots.release()
+                    break
+                self.run_job(job)
+                self._slots.release()
+            else:
+                future = self._executor.submit(self._run_job_in_thread, job)
+                self._prune().add(future)
+                future.add_done_callback(self._job_done)
+        return False
+
+    def _sleep(self, busy):
+        # A finishing job wakes us up, so only the next due job matters
+        # unless every worker is busy
+        self._wakeup.wait(self.max_sleep if busy else self.get_sleep_time())
+        self._wakeup.clear()
+
+    def run_due(self):
+        """
+        Runs jobs until none are due or running.
+        """
+        while not self.stopping:
+            busy = self.dispatch()
+            if not self._prune():
+                break
+            self._sleep(busy)
+
+    def get_sleep_time(self):
+        """
+        Returns the number of seconds until the next job is due.
+        """
+        next_run = Job.objects.filter(disabled=False, is_running=False) \
+            .aggregate(next_run=Min('next_run'))['next_run']
+        if next_run is None:
+            return self.max_sleep
+        delay = (next_run - now()).total_seconds()
+        if delay <= 0:
+            delay = MIN_SLEEP
+        return min(delay, self.max_sleep)
+
+    def close(self):
+        """
+        Waits for the running jobs and shuts down the worker threads and
+        processes.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self.worker_pool is not None:
+            self.worker_pool.stop()
+            self.worker_pool = None
+
+    def stop(self, *args):
+        self.stopping = True
+        self._wakeup.set()
+
+    def reload(self, *args):
+        self._reload = True
+        self._wakeup.set()
+
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, self.reload)
+
+    def serve_forever(self):
+        """
+        Runs due jobs until ``stop`` is called.
+
+        Errors, such as the database going away, are logged and retried
+        after a delay that doubles each time up to ``max_sleep``.
+        """
+        self.install_signal_handlers()
+        failures = 0
+        while not self.stopping:
+            try:
+                if self._reload:
+                    self._reload = False
+                    connections.close_all()
+                close_old_connections()
+                busy = self.dispatch()
+                if self.stopping:
+                    break
+                self._sleep(busy)
+                failures = 0
+            except Exception:
+                failures += 1
+                delay = min(MIN_SLEEP * 2 ** min(failures - 1, 16), self.max_sleep)
+                logger.exception('Error running the scheduler; retrying in %d seconds', delay)
+                connections.close_all()
+                self._wakeup.wait(delay)
+                self._wakeup.clear()
@@ -0,0 +1,9 @@
+from django.dispatch import Signal
+
+# Sent when a job starts running, with ``job`` and ``lag``: the number of
+# seconds it started after it was due, or ``None`` if it was started by hand.
+job_started = Signal()
+
+# Sent when a job has finished, with ``job``, ``successful``, ``duration`` (in
+# seconds) and ``lag``.
+job_finished = Signal()
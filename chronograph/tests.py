@@ -0,0 +1,722 @@
+import os
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import wait
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.conf.urls import url
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from chronograph.models import (
+    ALERT_FAILURE, ALERT_RECOVERED, MISFIRE_RUN_ALL, OVERLAP_SKIP, ConcurrencyGroup, Job,
+    Log, now,
+)
+from chronograph.admin import EstimatedCountPaginator
+from chronograph.notifications import Notifier
+from chronograph.output import BoundedOutput, drain, redirect_output
+from chronograph.scheduler import MIN_SLEEP, Scheduler
+from chronograph.workers import WorkerPool
+
+urlpatterns = [
+    url(r'^admin/', admin.site.urls),
+]
+
+
+def make_job(**kwargs):
+    kwargs.setdefault('name', 'job')
+    kwargs.setdefault('frequency', 'HOURLY')
+    kwargs.setdefault('shell_command', 'true')
+    return Job.objects.create(**kwargs)
+
+
+def make_due(job, ago=1):
+    Job.objects.filter(pk=job.pk).update(next_run=now() - timedelta(seconds=ago))
+    job.refresh_from_db()
+    return job
+
+
+class ClaimDueTestCase(TestCase):
+
+    def test_claims_due_jobs_once(self):
+        due = make_due(make_job(name='due'))
+        make_job(name='later')
+
+        claimed = Job.objects.claim_due(worker_id='a')
+        self.assertEqual([job.pk for job in claimed], [due.pk])
+        self.assertTrue(claimed[0].is_running)
+        self.assertEqual(claimed[0].running_by, 'a')
+        self.assertEqual(Job.objects.claim_due(worker_id='b'), [])
+
+    def test_exclude_and_not_before(self):
+        late = make_due(make_job(name='late'), ago=3600)
+        recent = make_due(make_job(name='recent'))
+
+        claimed = Job.objects.claim_due(worker_id='a', exclude=[recent.pk],
+                                        not_before=now() - timedelta(minutes=1))
+        self.assertEqual(claimed, [])
+        claimed = Job.objects.claim_due(worker_id='a', exclude=[recent.pk])
+        self.assertEqual([job.pk for job in claimed], [late.pk])
+
+    def test_priority_then_lateness(self):
+        low = make_due(make_job(name='low'), ago=60)
+        high = make_due(make_job(name='high', priority=5), ago=10)
+        older = make_due(make_job(name='older', priority=5), ago=20)
+
+        order = [Job.objects.claim_due(limit=1, worker_id='a')[0].pk for i in range(3)]
+        self.assertEqual(order, [older.pk, high.pk, low.pk])
+
+    def test_claimed_in_priority_order(self):
+        low = make_due(make_job(name='low'), ago=60)
+        high = make_due(make_job(name='high', priority=5), ago=10)
+        older = make_due(make_job(name='older', priority=5), ago=20)
+
+        claimed = Job.objects.claim_due(worker_id='a')
+        self.assertEqual([job.pk for job in claimed], [older.pk, high.pk, low.pk])
+
+    def test_concurrency_group(self):
+        group = ConcurrencyGroup.objects.create(name='db', max_concurrency=2)
+        for i in range(3):
+            make_due(make_job(name='grouped %d' % i, concurrency_group=group))
+        free = make_due(make_job(name='free'))
+
+        claimed = Job.objects.claim_due(worker_id='a')
+        self.assertEqual(len(claimed), 3)
+        self.assertIn(free.pk, [job.pk for job in claimed])
+        self.assertEqual(Job.objects.claim_due(worker_id='b'), [])
+
+        Job.objects.filter(pk=claimed[0].pk).update(is_running=False, running_by='')
+        self.assertEqual(len(Job.objects.claim_due(worker_id='b')), 1)
+
+    def test_reclaim_stale(self):
+        job = make_due(make_job())
+        Job.objects.claim_due(worker_id='a')
+        self.assertEqual(Job.objects.reclaim_stale(), 0)
+
+        Job.objects.filter(pk=job.pk).update(heartbeat=now() - timedelta(hours=1))
+        self.assertEqual(Job.objects.reclaim_stale(), 1)
+        job.refresh_from_db()
+        self.assertFalse(job.is_running)
+        self.assertFalse(job.last_run_successful)
+        self.assertEqual([j.pk for j in Job.objects.claim_due(worker_id='b')], [job.pk])
+
+
+class ScheduleTestCase(TestCase):
+
+    def setUp(self):
+        self.start = now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=10)
+
+    def test_next_run(self):
+        job = make_job(last_run=self.start)
+        self.assertEqual(job.get_next_run(self.start, self.start),
+                         self.start + timedelta(hours=1))
+
+    def test_misfire_run_all(self):
+        job = make_job(misfire_policy=MISFIRE_RUN_ALL, misfire_limit=3)
+        job.last_run = run_date = self.start + timedelta(hours=4, minutes=30)
+        # Due at start, +1h, ..., +4h: the late run stands in for +2h
+        self.assertEqual(job.get_next_run(self.start, run_date),
+                         self.start + timedelta(hours=3))
+        self.assertEqual(job.get_next_run(self.start + timedelta(hours=3), run_date),
+                         self.start + timedelta(hours=4))
+        self.assertEqual(job.get_next_run(self.start + timedelta(hours=4), run_date),
+                         self.start + timedelta(hours=5, minutes=30))
+
+    def test_overlapping_runs(self):
+        job = make_job(frequency='MINUTELY')
+        job.last_run = run_date = self.start
+        end_date = self.start + timedelta(minutes=3, seconds=30)
+        self.assertEqual(job.get_overlapping_runs(run_date, end_date), 3)
+        self.assertEqual(job.get_next_run(run_date, run_date, end_date), end_date)
+
+        job.overlap_policy = OVERLAP_SKIP
+        self.assertEqual(job.get_next_run(run_date, run_date, end_date),
+                         self.start + timedelta(minutes=4))
+
+    def test_jitter(self):
+        job = make_job(params='byminute:0;bysecond:0', jitter=600)
+        offset = timedelta(seconds=job.get_jitter_offset())
+        self.assertEqual(job.next_run.minute * 60 + job.next_run.second, offset.seconds)
+
+        # The offset doesn't add up from one run to the next
+        job.last_run = run_date = self.start + offset
+        self.assertEqual(job.get_next_run(run_date, run_date),
+                         self.start + timedelta(hours=1) + offset)
+
+    def test_skip_run(self):
+        job = make_due(make_job(params='byminute:0;bysecond:0', jitter=600), ago=7200)
+        [job] = Job.objects.claim_due(worker_id='a')
+        job.skip_run()
+
+        job.refresh_from_db()
+        self.assertFalse(job.is_running)
+        self.assertGreater(job.next_run, now())
+        self.assertEqual(job.next_run.minute * 60 + job.next_run.second,
+                         job.get_jitter_offset())
+
+    def test_skip_run_of_reclaimed_job(self):
+        job = make_due(make_job())
+        [job] = Job.objects.claim_due(worker_id='a')
+        Job.objects.filter(pk=job.pk).update(running_by='b')
+        job.skip_run()
+
+        job.refresh_from_db()
+        self.assertTrue(job.is_running)
+        self.assertEqual(job.running_by, 'b')
+
+
+class RunTestCase(TestCase):
+
+    def test_run(self):
+        job = make_due(make_job(shell_command='echo hello'))
+        job.run()
+
+        job.refresh_from_db()
+        self.assertFalse(job.is_running)
+        self.assertTrue(job.last_run_successful)
+        self.assertGreater(job.next_run, now())
+        self.assertEqual(job.total_runs, 1)
+        self.assertEqual(Log.objects.get(job=job).get_stdout(), 'hello\n')
+
+    def test_already_running(self):
+        make_due(make_job())
+        [claimed] = Job.objects.claim_due(worker_id='a')
+        # E.g. the admin's Run button while a scheduler runs the job
+        job = Job.objects.get(pk=claimed.pk)
+        self.assertFalse(job.run())
+        self.assertFalse(Log.objects.exists())
+
+        self.assertTrue(claimed.run())
+        claimed.refresh_from_db()
+        self.assertFalse(claimed.is_running)
+        self.assertEqual(claimed.total_runs, 1)
+
+    def test_timed_management_command(self):
+        job = make_job(shell_command='', command='check', timeout=60)
+        job.run()
+
+        job.refresh_from_db()
+        self.assertTrue(job.last_run_successful)
+        self.assertIn('no issues', Log.objects.get(job=job).get_stdout())
+
+    @override_settings(CHRONOGRAPH_LOG_COMPRESSION='zip')
+    def test_unknown_compression(self):
+        job = make_due(make_job(shell_command='echo hello'))
+        with self.assertLogs('chronograph.compression', 'WARNING'):
+            job.run()
+
+        log = Log.objects.get(job=job)
+        self.assertEqual(log.compression, '')
+        self.assertEqual(log.get_stdout(), 'hello\n')
+
+    def test_lost_lease(self):
+        job = make_due(make_job())
+        [job] = Job.objects.claim_due(worker_id='a')
+        next_run = job.next_run
+        # Reclaimed and claimed by another scheduler while running
+        Job.objects.filter(pk=job.pk).update(running_by='b')
+        with self.assertLogs('chronograph.models', 'WARNING'):
+            job.run()
+
+        job.refresh_from_db()
+        self.assertTrue(job.is_running)
+        self.assertEqual(job.running_by, 'b')
+        self.assertEqual(job.next_run, next_run)
+        self.assertEqual(job.total_runs, 0)
+
+
+class DaemonTestCase(TestCase):
+
+    def setUp(self):
+        self.scheduler = Scheduler(max_sleep=60, worker_id='test')
+        self.addCleanup(self.scheduler.close)
+
+    def test_sleep_time(self):
+        self.assertEqual(self.scheduler.get_sleep_time(), 60)
+        job = make_job(frequency='MINUTELY')
+        self.assertAlmostEqual(self.scheduler.get_sleep_time(),
+                               (job.next_run - now()).total_seconds(), delta=1)
+        make_due(job)
+        self.assertEqual(self.scheduler.get_sleep_time(), MIN_SLEEP)
+
+    def test_serve_forever_retries_after_errors(self):
+        calls = []
+
+        def dispatch():
+            calls.append(now())
+            if len(calls) == 1:
+                raise DatabaseError('the database went away')
+            self.scheduler.stop()
+            return False
+
+        with mock.patch.object(self.scheduler, 'dispatch', dispatch), \
+                mock.patch.object(self.scheduler, 'install_signal_handlers'), \
+                self.assertLogs('chronograph.scheduler', 'ERROR'):
+            self.scheduler.serve_forever()
+
+        self.assertEqual(len(calls), 2)
+        self.assertGreaterEqual((calls[1] - calls[0]).total_seconds(), MIN_SLEEP * 0.9)
+
+    def test_reload(self):
+        self.scheduler.reload()
+        self.scheduler.dispatch = mock.Mock(side_effect=self.scheduler.stop)
+        with mock.patch.object(self.scheduler, 'install_signal_handlers'), \
+                mock.patch('chronograph.scheduler.connections') as connections:
+            self.scheduler.serve_forever()
+        self.assertTrue(connections.close_all.called)
+        self.assertFalse(self.scheduler._reload)
+
+
+class SchedulerTestCase(TransactionTestCase):
+
+    def make_scheduler(self, **kwargs):
+        scheduler = Scheduler(max_sleep=1, worker_id='test', **kwargs)
+        self.addCleanup(scheduler.close)
+        return scheduler
+
+    def test_run_due(self):
+        jobs = [make_due(make_job(name='job %d' % i, shell_command='sleep 1')) for i in range(2)]
+        started = time.time()
+        self.make_scheduler(workers=2).run_due()
+
+        self.assertLess(time.time() - started, 1.9)
+        for job in jobs:
+            job.refresh_from_db()
+            self.assertEqual(job.total_runs, 1)
+            self.assertFalse(job.is_running)
+            self.assertGreater(job.next_run, now())
+
+    def test_long_job_does_not_hold_up_others(self):
+        slow = make_due(make_job(name='slow', shell_command='sleep 2', priority=2))
+        make_due(make_job(name='first', priority=1))
+        last = make_due(make_job(name='last'))
+        self.make_scheduler(workers=2).run_due()
+
+        self.assertLess(Log.objects.get(job=last).end_date,
+                        Log.objects.get(job=slow).end_date)
+
+    @override_settings(CHRONOGRAPH_HEARTBEAT_INTERVAL=0.1)
+    def test_run_alone_keeps_its_claim_while_waiting(self):
+        make_due(make_job(name='running', shell_command='sleep 0.5', priority=1))
+        alone = make_due(make_job(name='alone', run_alone=True))
+        reclaimed = []
+
+        def slow_wait(futures):
+            wait(futures)
+            time.sleep(1)
+            # Another scheduler looking for abandoned jobs meanwhile
+            reclaimed.append(Job.objects.reclaim_stale(lease=0.5))
+
+        with mock.patch('chronograph.scheduler.wait', slow_wait):
+            self.make_scheduler(workers=2).run_due()
+
+        self.assertEqual(reclaimed, [0])
+        alone.refresh_from_db()
+        self.assertTrue(alone.last_run_successful)
+        self.assertEqual(alone.total_runs, 1)
+
+
+class BoundedOutputTestCase(SimpleTestCase):
+
+    def test_short_output(self):
+        output = BoundedOutput(head=5, tail=5)
+        output.write('abc')
+        output.write('defg')
+        self.assertEqual(output.getvalue(), 'abcdefg')
+        self.assertEqual(output.dropped, 0)
+
+    def test_head_and_tail(self):
+        output = BoundedOutput(head=5, tail=5)
+        for data in ('abc', 'defgh', 'ijklmnop'):
+            output.write(data)
+        self.assertEqual(output.dropped, 6)
+        self.assertEqual(output.getvalue(),
+                         'abcde\n\n*** 6 characters of output omitted\n\nlmnop')
+
+    def test_drain_split_characters(self):
+        output = BoundedOutput()
+        with mock.patch('chronograph.output.CHUNK_SIZE', 1):
+            drain(BytesIO('h\xe9llo \u20ac'.encode('utf-8')), output)
+        self.assertEqual(output.getvalue(), 'h\xe9llo \u20ac')
+
+    @override_settings(CHRONOGRAPH_OUTPUT_HEAD_SIZE=10, CHRONOGRAPH_OUTPUT_TAIL_SIZE=10)
+    def test_shell_command(self):
+        successful, stdout, stderr = Job(shell_command='seq 1 100000').run_shell_command()
+        self.assertTrue(successful)
+        self.assertTrue(stdout.startswith('1\n2\n3\n4\n5\n\n\n*** '))
+        self.assertTrue(stdout.endswith('99\n100000\n'))
+
+
+class NotifierTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.notifier = Notifier()
+        self.addCleanup(self.notifier.stop)
+
+    def message(self, subject='Job failed', to='admin@example.com'):
+        return EmailMessage(subject=subject, body=subject, to=[to])
+
+    def test_send_straight_away_until_started(self):
+        self.notifier.send(self.message())
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(CHRONOGRAPH_EMAIL_INTERVAL=60)
+    def test_queued_once_started(self):
+        self.notifier.start()
+        for i in range(3):
+            self.notifier.send(self.message('Message %d' % i))
+        self.assertEqual(mail.outbox, [])
+
+        self.assertEqual(self.notifier.flush(), 3)
+        self.assertEqual([m.subject for m in mail.outbox],
+                         ['Message 0', 'Message 1', 'Message 2'])
+        self.assertEqual(self.notifier.flush(), 0)
+
+    @override_settings(CHRONOGRAPH_EMAIL_INTERVAL=60)
+    def test_stop_sends_the_rest(self):
+        self.notifier.start()
+        self.notifier.send(self.message())
+        self.notifier.stop()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertFalse(self.notifier.running)
+
+    @override_settings(CHRONOGRAPH_EMAIL_INTERVAL=0.05)
+    def test_background_thread(self):
+        self.notifier.start()
+        self.notifier.send(self.message())
+        for i in range(100):
+            if mail.outbox:
+                break
+            time.sleep(0.05)
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(CHRONOGRAPH_EMAIL_INTERVAL=60, CHRONOGRAPH_EMAIL_DIGEST=True)
+    def test_digest(self):
+        job = Job(pk=1)
+        self.notifier.start()
+        self.notifier.send(self.message(to='a@example.com'), job=job, failure=True)
+        self.notifier.send(self.message(to='b@example.com'), job=job, failure=True)
+        self.notifier.send(self.message('Job output'), job=job)
+        self.notifier.send(self.message('Other job failed'), job=Job(pk=2), failure=True)
+        self.assertEqual(self.notifier.flush(), 3)
+
+        subjects = sorted(m.subject for m in mail.outbox)
+        self.assertEqual(subjects, ['Job failed (2 failures)', 'Job output', 'Other job failed'])
+        digest = [m for m in mail.outbox if m.subject.endswith('failures)')][0]
+        self.assertEqual(digest.to, ['a@example.com', 'b@example.com'])
+
+    @override_settings(CHRONOGRAPH_EMAIL_INTERVAL=60)
+    def test_send_error(self):
+        self.notifier.start()
+        self.notifier.send(self.message())
+        with mock.patch('chronograph.notifications.get_connection') as get_connection, \
+                self.assertLogs('chronograph.notifications', 'ERROR'):
+            get_connection.return_value.send_messages.side_effect = IOError('no server')
+            self.assertEqual(self.notifier.flush(), 0)
+
+
+@override_settings(ROOT_URLCONF='chronograph.tests', EMAIL_SUBJECT_PREFIX='')
+class AlertTestCase(TestCase):
+
+    def setUp(self):
+        self.job = make_job(name='failing', shell_command="sh -c 'echo oops >&2; exit 1'")
+        self.job.subscribers.add(User.objects.create(username='admin', email='admin@example.com'))
+
+    def set_command(self, command):
+        Job.objects.filter(pk=self.job.pk).update(shell_command=command)
+        self.job.refresh_from_db()
+
+    def test_repeated_failure_sent_once(self):
+        self.job.run()
+        self.job.run()
+        self.assertEqual([m.subject for m in mail.outbox], ['failing'])
+        self.assertEqual(mail.outbox[0].to, ['"admin" <admin@example.com>'])
+
+        self.set_command("sh -c 'echo something else >&2; exit 1'")
+        self.job.run()
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_recovery(self):
+        self.job.run()
+        self.set_command('true')
+        self.job.run()
+        self.job.run()
+        self.assertEqual([m.subject for m in mail.outbox], ['failing', 'failing recovered'])
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.alert_hash, '')
+
+    def test_no_recovery_without_alert(self):
+        self.set_command('true')
+        self.job.run()
+        self.assertEqual(mail.outbox, [])
+
+    @override_settings(CHRONOGRAPH_ALERT_WINDOW=60)
+    def test_alert_window(self):
+        when = now()
+        job = Job()
+        self.assertEqual(job.update_alert_state(False, 'oops', when), ALERT_FAILURE)
+        self.assertIsNone(job.update_alert_state(False, 'oops', when + timedelta(seconds=59)))
+        self.assertEqual(job.update_alert_state(False, 'oops', when + timedelta(seconds=61)),
+                         ALERT_FAILURE)
+        self.assertEqual(job.update_alert_state(True, '', when), ALERT_RECOVERED)
+        self.assertIsNone(job.update_alert_state(True, '', when))
+
+
+class RedirectOutputTestCase(SimpleTestCase):
+
+    def test_threads(self):
+        outputs = {}
+        barrier = threading.Barrier(3)
+
+        def target(name):
+            outputs[name] = stdout, stderr = BoundedOutput(), BoundedOutput()
+            with redirect_output(stdout, stderr):
+                barrier.wait()
+                for i in range(100):
+                    print('%s %d' % (name, i))
+                    sys.stderr.write(name)
+                barrier.wait()
+            print('after', file=outputs[name][0])
+
+        threads = [threading.Thread(target=target, args=(name,)) for name in 'ab']
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        # This thread's output isn't redirected meanwhile
+        for stream in (sys.stdout, sys.stderr):
+            self.assertNotIn(stream.get_stream(), [o for pair in outputs.values() for o in pair])
+        barrier.wait()
+        for thread in threads:
+            thread.join()
+
+        for name in 'ab':
+            stdout, stderr = outputs[name]
+            self.assertEqual(stdout.getvalue(),
+                             ''.join('%s %d\n' % (name, i) for i in range(100)) + 'after\n')
+            self.assertEqual(stderr.getvalue(), name * 100)
+
+    def test_nested(self):
+        outer, inner = BoundedOutput(), BoundedOutput()
+        errors = BoundedOutput()
+        with redirect_output(outer, errors):
+            print('outer')
+            with redirect_output(inner, errors):
+                print('inner')
+            print('outer again')
+        self.assertEqual(outer.getvalue(), 'outer\nouter again\n')
+        self.assertEqual(inner.getvalue(), 'inner\n')
+
+    def test_management_commands_in_threads(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            Job(command='check')._call_management_command())) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), 4)
+        for successful, stdout, stderr in results:
+            self.assertTrue(successful)
+            self.assertEqual(stdout.count('no issues'), 1)
+
+
+class DependencyTestCase(TestCase):
+
+    def setUp(self):
+        self.first = make_job(name='first')
+        self.second = make_job(name='second')
+        self.dependent = make_job(name='dependent', frequency='YEARLY')
+        self.dependent.depends_on.set([self.first, self.second])
+
+    def test_trigger_when_all_succeeded(self):
+        self.first.run()
+        self.dependent.refresh_from_db()
+        self.assertGreater(self.dependent.next_run, now())
+
+        self.second.run()
+        self.dependent.refresh_from_db()
+        self.assertLessEqual(self.dependent.next_run, now())
+
+    def test_no_trigger_after_failure(self):
+        self.first.run()
+        Job.objects.filter(pk=self.second.pk).update(shell_command='false')
+        self.second.refresh_from_db()
+        self.second.run()
+        self.dependent.refresh_from_db()
+        self.assertGreater(self.dependent.next_run, now())
+
+    def test_trigger_running_dependent(self):
+        self.first.run()
+        make_due(self.dependent)
+        [running] = Job.objects.claim_due(worker_id='a')
+        self.second.run()
+        self.dependent.refresh_from_db()
+        self.assertTrue(self.dependent.trigger_pending)
+        self.assertLess(self.dependent.next_run, now())
+
+        running.run()
+        self.dependent.refresh_from_db()
+        self.assertFalse(self.dependent.trigger_pending)
+        self.assertLessEqual(self.dependent.next_run, now())
+        self.assertGreaterEqual(self.dependent.next_run, running.last_run)
+
+    def test_cycle(self):
+        self.assertTrue(self.first.creates_cycle([self.dependent]))
+        self.assertTrue(self.first.creates_cycle([self.first]))
+        self.assertFalse(self.first.creates_cycle([self.second]))
+
+
+class CronCleanTestCase(TestCase):
+
+    def setUp(self):
+        self.job = make_job()
+        self.now = now()
+
+    def add_logs(self, job, days, success=True):
+        for day in days:
+            Log.objects.create(job=job, run_date=self.now - timedelta(days=day),
+                               success=success)
+
+    def clean(self, *args):
+        call_command('cron_clean', *args, stdout=StringIO())
+
+    def test_clean(self):
+        self.add_logs(self.job, range(10))
+        self.clean('days', '5', '--batch-size', '2')
+        self.assertEqual(Log.objects.count(), 5)
+
+    def test_dry_run(self):
+        self.add_logs(self.job, range(10))
+        self.clean('days', '5', '--dry-run')
+        self.assertEqual(Log.objects.count(), 10)
+
+    def test_keep_runs(self):
+        Job.objects.filter(pk=self.job.pk).update(log_keep_runs=7)
+        other = make_job(name='other')
+        self.add_logs(self.job, range(10))
+        self.add_logs(other, range(10))
+        self.clean('days', '5')
+        self.assertEqual(self.job.log_set.count(), 7)
+        self.assertEqual(other.log_set.count(), 5)
+
+    def test_keep_failures(self):
+        Job.objects.filter(pk=self.job.pk).update(log_keep_failures_days=30)
+        self.add_logs(self.job, range(10))
+        self.add_logs(self.job, (10, 20, 40), success=False)
+        self.clean('days', '5')
+        self.assertEqual(self.job.log_set.filter(success=True).count(), 5)
+        self.assertEqual(self.job.log_set.filter(success=False).count(), 2)
+
+
+class WorkerPoolTestCase(TestCase):
+
+    def make_pool(self, **kwargs):
+        pool = WorkerPool(1, **kwargs)
+        self.addCleanup(pool.stop)
+        return pool
+
+    def worker(self, pool):
+        return pool._idle.queue[0]
+
+    def test_run(self):
+        pool = self.make_pool()
+        successful, stdout, stderr = pool.run(Job(command='check'))
+        self.assertTrue(successful)
+        self.assertIn('no issues', stdout)
+        # Starting the workers leaves this process's connection alone
+        self.assertEqual(Job.objects.count(), 0)
+
+    def test_retire(self):
+        pool = self.make_pool(max_jobs=1)
+        first = self.worker(pool).process.pid
+        self.assertTrue(pool.run(Job(command='check'))[0])
+        self.assertNotEqual(self.worker(pool).process.pid, first)
+        self.assertTrue(pool.run(Job(command='check'))[0])
+
+    def test_timeout(self):
+        pool = self.make_pool()
+        job = Job(command='shell', args='command=__import__("time").sleep(60)')
+        successful, stdout, stderr = pool.run(job, timeout=1)
+        self.assertFalse(successful)
+        self.assertIn('timed out', stderr)
+        self.assertTrue(pool.run(Job(command='check'))[0])
+
+    def test_worker_died_while_idle(self):
+        pool = self.make_pool()
+        worker = self.worker(pool)
+        os.kill(worker.process.pid, signal.SIGKILL)
+        worker.process.wait()
+        self.assertTrue(pool.run(Job(command='check'))[0])
+        self.assertTrue(pool.run(Job(command='check'))[0])
+
+    def test_worker_died_while_running(self):
+        pool = self.make_pool()
+        job = Job(command='shell', args='command=__import__("os").kill(__import__("os").getpid(),9)')
+        successful, stdout, stderr = pool.run(job)
+        self.assertFalse(successful)
+        self.assertIn('Worker ended', stderr)
+        self.assertTrue(pool.run(Job(command='check'))[0])
+
+
+class CronBenchmarkTestCase(TestCase):
+
+    def test_benchmark(self):
+        stdout = StringIO()
+        call_command('cron_benchmark', logs=50, jobs=2, stdout=stdout)
+        self.assertIn('Without indexes', stdout.getvalue())
+        self.assertFalse(Job.objects.exists())
+        self.assertFalse(Log.objects.exists())
+
+
+@override_settings(ROOT_URLCONF='chronograph.tests')
+class LogAdminTestCase(TestCase):
+
+    def setUp(self):
+        self.job = make_job()
+        start = now()
+        Log.objects.bulk_create(Log(job=self.job, run_date=start - timedelta(minutes=i),
+                                    stdout='output %d' % i)
+                                for i in range(150))
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.client.force_login(user)
+
+    def test_estimated_count(self):
+        with mock.patch('chronograph.admin._estimate_count', return_value=10 ** 6):
+            logs = Log.objects.all()
+            self.assertEqual(EstimatedCountPaginator(logs, 100).count, 10 ** 6)
+            keyset = logs.filter(run_date__lt=now())
+            self.assertEqual(EstimatedCountPaginator(keyset, 100).count, 10 ** 6)
+            filtered = logs.filter(success=True)
+            self.assertEqual(EstimatedCountPaginator(filtered, 100).count, 150)
+
+    def test_small_table_is_counted(self):
+        with mock.patch('chronograph.admin._estimate_count', return_value=10):
+            self.assertEqual(EstimatedCountPaginator(Log.objects.all(), 100).count, 150)
+
+    def test_older_logs(self):
+        response = self.client.get('/admin/chronograph/log/', {'q': 'job'})
+        self.assertEqual(response.status_code, 200)
+        older_url = response.context['cl'].older_logs_url()
+        self.assertIn('q=job', older_url)
+        self.assertIn('run_date__lt=', older_url)
+        self.assertContains(response, 'Older logs')
+        self.assertIsNone(response.context['cl'].date_hierarchy)
+        self.assertContains(response, 'output 99')
+        self.assertNotContains(response, 'output 100<')
+
+        response = self.client.get('/admin/chronograph/log/' + older_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'output 100')
+        self.assertNotContains(response, 'output 99<')
+        # The last page isn't full
+        self.assertIsNone(response.context['cl'].older_logs_url())
@@ -1,9 +1,25 @@
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.decorators import user_passes_test
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
 
 from chronograph.admin import JobAdmin
+from chronograph.metrics import render_prometheus
 from chronograph.models import Job
 
 def job_run(request, pk):
     return JobAdmin(Job, admin.site).run_job_view(request, pk)
 job_run = user_passes_test(lambda user: user.is_superuser)(job_run)
+
+def metrics(request):
+    """
+    Shows the job metrics in the Prometheus text format to staff users, or
+    to requests with ``Authorization: Bearer <CHRONOGRAPH_METRICS_TOKEN>``.
+    """
+    token = getattr(settings, 'CHRONOGRAPH_METRICS_TOKEN', None)
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    if not (token and constant_time_compare(authorization, 'Bearer %s' % token)) \
+            and not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,191 @@
+import logging
+import multiprocessing.connection
+import resource
+import signal
+import socket
+import sys
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Run by ``python -c`` in each worker; the first argument is the descriptor of
+# its end of the socket, the others its ``max_jobs`` and ``max_memory``.
+_WORKER_SCRIPT = (
+    "import sys, django; django.setup(); "
+    "from chronograph.workers import _worker_main; "
+    "_worker_main(int(sys.argv[1]), int(sys.argv[2]), float(sys.argv[3]))"
+)
+
+
+def _max_rss():
+    """
+    Returns the peak resident memory of this process in megabytes.
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return rss / (1024 * 1024)
+    return rss / 1024
+
+
+def _worker_main(fd, max_jobs, max_memory):
+    for signum in (signal.SIGTERM, signal.SIGHUP, signal.SIGINT):
+        signal.signal(signum, signal.SIG_DFL)
+
+    conn = multiprocessing.connection.Connection(fd)
+    jobs = 0
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        successful, stdout, stderr = job._call_management_command()
+        jobs += 1
+        retire = bool((max_jobs and jobs >= max_jobs) or
+                      (max_memory and _max_rss() > max_memory))
+        conn.send((successful, stdout, stderr, retire))
+        if retire:
+            break
+    conn.close()
+
+
+class Worker(object):
+    """
+    A Python process, started and set up ahead of time, which runs the
+    management commands of the jobs sent to it.
+
+    It is a new interpreter rather than a fork of the scheduler, whose other
+    threads may hold locks (and database connections) at the time.
+    """
+
+    def __init__(self, max_jobs=None, max_memory=None):
+        from chronograph.models import _start_python
+
+        ours, theirs = socket.socketpair()
+        try:
+            self.process = _start_python(
+                _WORKER_SCRIPT, [str(theirs.fileno()), str(max_jobs or 0), str(max_memory or 0)],
+                pass_fds=(theirs.fileno(),))
+        except Exception:
+            ours.close()
+            raise
+        finally:
+            theirs.close()
+        self.conn = multiprocessing.connection.Connection(ours.detach())
+        self.alive = True
+
+    def is_alive(self):
+        """
+        Returns ``True`` if the worker can be sent another job.
+        """
+        return self.alive and self.process.poll() is None
+
+    def run(self, job, timeout=None):
+        """
+        Runs ``job``'s management command and returns ``(successful, stdout,
+        stderr)``.  The worker is killed if it takes more than ``timeout``
+        seconds.
+        """
+        from chronograph.models import _TIMEOUT_MESSAGE, _kill_process_group, _wait
+
+        try:
+            self.conn.send(job)
+            finished = self.conn.poll(timeout)
+        except (EOFError, OSError):
+            return self._died()
+        if not finished:
+            self.alive = False
+            _kill_process_group(self.process.pid, lambda grace: _wait(self.process, grace))
+            self.process.wait()
+            self.conn.close()
+            return False, "", _TIMEOUT_MESSAGE % timeout
+
+        try:
+            successful, stdout, stderr, retire = self.conn.recv()
+        except (EOFError, OSError):
+            return self._died()
+
+        if retire:
+            self.alive = False
+            self.process.wait()
+            self.conn.close()
+        return successful, stdout, stderr
+
+    def _died(self):
+        # The worker went away, e.g. it was killed for using too much memory
+        self.alive = False
+        self.process.wait()
+        self.conn.close()
+        return False, "", "\n\n*** Worker ended with exit code %s\n\n" % self.process.returncode
+
+    def stop(self):
+        if self.alive:
+            try:
+                self.conn.send(None)
+            except (IOError, OSError):
+                pass
+            self.alive = False
+        self.process.wait()
+        self.conn.close()
+
+
+class WorkerPool(object):
+    """
+    A pool of ``size`` workers started ahead of time.
+
+    Each worker is replaced after running ``CHRONOGRAPH_WORKER_MAX_JOBS`` jobs
+    (default: 100), once its peak memory use exceeds
+    ``CHRONOGRAPH_WORKER_MAX_MEMORY`` megabytes (default: no limit), or when
+    it has died.
+    """
+
+    def __init__(self, size, max_jobs=None, max_memory=None):
+        if max_jobs is None:
+            max_jobs = getattr(settings, 'CHRONOGRAPH_WORKER_MAX_JOBS', 100)
+        if max_memory is None:
+            max_memory = getattr(settings, 'CHRONOGRAPH_WORKER_MAX_MEMORY', None)
+        self.size = size
+        self.max_jobs = max_jobs
+        self.max_memory = max_memory
+        self._idle = queue.Queue()
+        for i in range(size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self):
+        return Worker(max_jobs=self.max_jobs, max_memory=self.max_memory)
+
+    def run(self, job, timeout=None):
+        """
+        Runs ``job``'s management command on the next idle worker.
+        """
+        worker = self._idle.get()
+        try:
+            if not worker.is_alive():
+                # It died while idle
+                worker = self._replace(worker)
+            return worker.run(job, timeout)
+        finally:
+            if not worker.is_alive():
+                worker = self._replace(worker)
+            self._idle.put(worker)
+
+    def _replace(self, worker):
+        # Keeps the dead worker, to be replaced next time, if a new one
+        # can't be started
+        worker.stop()
+        try:
+            return self._spawn()
+        except Exception:
+            logger.exception('Error starting a worker process')
+            return worker
+
+    def stop(self):
+        for i in range(self.size):
+            self._idle.get().stop()